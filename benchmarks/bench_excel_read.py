@@ -0,0 +1,85 @@
+"""Benchmark Excel reading: pandas' default openpyxl load vs. read-only streaming vs. calamine.
+
+Each engine runs in a fresh subprocess so peak RSS is measured independently.
+
+    python benchmarks/bench_excel_read.py --rows 500000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+import pandas as pd
+
+from readers import HAS_CALAMINE, read_excel_with_engine
+
+ENGINES = ["openpyxl", "openpyxl-readonly", "calamine"]
+
+
+def make_workbook(path, rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "value": rng.normal(size=rows),
+        "count": rng.integers(0, 1000, rows),
+        "category": rng.choice(["north", "south", "east", "west"], rows),
+        "date": pd.date_range("2020-01-01", periods=rows, freq="min"),
+    })
+    df.to_excel(path, index=False)
+
+
+def run_one(path, engine):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        df = read_excel_with_engine(f, engine)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    print(json.dumps({"rows": len(df), "seconds": elapsed, "peak_rss": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--path", help="existing .xlsx file to read instead of a generated one")
+    parser.add_argument("--engine", choices=ENGINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        run_one(args.path, args.engine)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if path is None:
+            path = os.path.join(tmp, "bench.xlsx")
+            print(f"Writing {args.rows:,} rows to {path} ...")
+            make_workbook(path, args.rows)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"Workbook size: {size_mb:.1f} MB\n")
+        print(f"{'engine':<20}{'rows':>12}{'seconds':>10}{'rows/sec':>12}{'peak RSS (MB)':>15}")
+        for engine in ENGINES:
+            if engine == "calamine" and not HAS_CALAMINE:
+                print(f"{engine:<20}{'skipped (python-calamine not installed)':>49}")
+                continue
+            out = subprocess.run(
+                [sys.executable, __file__, "--path", path, "--engine", engine],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(
+                f"{engine:<20}{result['rows']:>12,}{result['seconds']:>10.2f}"
+                f"{result['rows'] / result['seconds']:>12,.0f}{result['peak_rss'] / (1024 * 1024):>15.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark Excel writing: pandas' openpyxl to_excel vs. chunked openpyxl vs. xlsxwriter constant memory.
+
+Each writer runs in a fresh subprocess so peak RSS is measured independently;
+the RSS of the generated frame alone is reported as a baseline.
+
+    python benchmarks/bench_excel_write.py --rows 500000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+import pandas as pd
+
+from writers import HAS_XLSXWRITER, frame_chunks, write_excel, write_excel_constant_memory
+
+WRITERS = ["baseline", "openpyxl", "openpyxl-chunked", "xlsxwriter"]
+
+
+def make_frame(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "value": rng.normal(size=rows),
+        "count": rng.integers(0, 1000, rows),
+        "category": rng.choice(["north", "south", "east", "west"], rows),
+        "date": pd.date_range("2020-01-01", periods=rows, freq="min"),
+    })
+
+
+def run_one(path, writer, rows):
+    df = make_frame(rows)
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        if writer == "openpyxl":
+            df.to_excel(f, index=False, engine="openpyxl")
+        elif writer == "openpyxl-chunked":
+            write_excel(frame_chunks(df), f)
+        elif writer == "xlsxwriter":
+            write_excel_constant_memory(frame_chunks(df), f)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    print(json.dumps({"rows": len(df), "seconds": elapsed, "peak_rss": peak, "size": os.path.getsize(path)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--writer", choices=WRITERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer:
+        run_one(args.path, args.writer, args.rows)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {args.rows:,} rows\n")
+        print(f"{'writer':<20}{'seconds':>10}{'rows/sec':>12}{'size (MB)':>12}{'peak RSS (MB)':>15}")
+        for writer in WRITERS:
+            if writer == "xlsxwriter" and not HAS_XLSXWRITER:
+                print(f"{writer:<20}{'skipped (xlsxwriter not installed)':>49}")
+                continue
+            path = os.path.join(tmp, f"{writer}.xlsx")
+            out = subprocess.run(
+                [sys.executable, __file__, "--path", path, "--writer", writer, "--rows", str(args.rows)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            if writer == "baseline":
+                print(f"{writer:<20}{'':>10}{'':>12}{'':>12}{result['peak_rss'] / (1024 * 1024):>15.0f}")
+                continue
+            print(
+                f"{writer:<20}{result['seconds']:>10.2f}{result['rows'] / result['seconds']:>12,.0f}"
+                f"{result['size'] / (1024 * 1024):>12.1f}{result['peak_rss'] / (1024 * 1024):>15.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
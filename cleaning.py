@@ -0,0 +1,548 @@
+"""Data cleaning for Data Sweeper, for whole frames and for chunk streams
+
+Cleaning operations are recorded as a plan (a list of steps), optimized and
+run in one pass by run_plan / run_plan_chunks.
+
+Functions here never touch Streamlit: they return (level, text) messages that
+the UI shows with st.success / st.warning, so they can also run in worker
+processes.
+"""
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from dedup import DEDUP_BUCKETS, spill_duplicates, key_hashes, load_hash_index, in_hash_index
+from sketches import column_quantiles, column_modes, group_quantiles, group_modes
+from groups import group_codes, group_frame, group_rows
+from normalize import TEXT_OPERATIONS, text_operations, normalize_text
+
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# track_allocations blocks in flight, and whether they started tracemalloc
+_tracing = {"blocks": 0, "started": False}
+_tracing_lock = threading.Lock()
+
+# Copy-on-write (always on from pandas 3): frames derived from another share its
+# column buffers until one side writes, so cleaning never copies untouched columns
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Cleaning step kinds; a plan is a list of (kind, options) steps, recorded in the
+# order the user applies them and run as one pass
+DROP_DUPLICATES = "drop_duplicates"
+FILL_NULLS = "fill_nulls"
+DROP_NULLS = "drop_nulls"
+DROP_SEEN = "drop_seen"
+NORMALIZE_TEXT = "normalize_text"
+STEP_LABELS = {
+    DROP_DUPLICATES: "Remove Duplicates",
+    DROP_SEEN: "Remove Previously Seen Rows",
+    FILL_NULLS: "Fill Missing Values",
+    DROP_NULLS: "Remove Null Rows",
+    NORMALIZE_TEXT: "Normalize Text",
+}
+
+# Fill strategies: statistics of the numeric columns, or the most frequent value of every column
+FILL_STRATEGIES = ["mean", "median", "quantile", "mode"]
+
+# Running sums are kept exactly: every float64 is an integer multiple of 2**-EXACT_SCALE
+EXACT_SCALE = 1126
+
+def exact_sum(values):
+    """Exact sum of finite float64 values, as a Python int in units of 2**-EXACT_SCALE"""
+    mantissas, exponents = np.frexp(values)
+    ints = (mantissas * 2.0 ** 53).astype(np.int64)
+    if not len(ints):
+        return 0
+    # Values are grouped by exponent; the group sums are taken in two 26/27-bit halves
+    # so that the int64 accumulators cannot overflow
+    groups = exponents - exponents.min()
+    high = np.zeros(groups.max() + 1, dtype=np.int64)
+    low = np.zeros(groups.max() + 1, dtype=np.int64)
+    np.add.at(high, groups, ints >> 26)
+    np.add.at(low, groups, ints & (2 ** 26 - 1))
+    base = int(exponents.min()) + EXACT_SCALE - 53
+    return sum(((int(h) << 26) + int(l)) << (base + shift) for shift, (h, l) in enumerate(zip(high, low)) if h or l)
+
+def exact_group_sums(values, codes, groups):
+    """Exact sums of finite float64 values per group code (0 to groups - 1), as {code: int} like exact_sum"""
+    mantissas, exponents = np.frexp(values)
+    ints = (mantissas * 2.0 ** 53).astype(np.int64)
+    if not len(ints):
+        return {}
+    # One slot per (group, exponent) pair, numbered densely unless that would outgrow the values
+    offsets = exponents - exponents.min()
+    span = int(offsets.max()) + 1
+    slots = codes.astype(np.int64) * span + offsets
+    if groups * span > len(slots):
+        keys, slots = np.unique(slots, return_inverse=True)
+    else:
+        keys = np.arange(groups * span)
+    high = np.zeros(len(keys), dtype=np.int64)
+    low = np.zeros(len(keys), dtype=np.int64)
+    np.add.at(high, slots, ints >> 26)
+    np.add.at(low, slots, ints & (2 ** 26 - 1))
+    base = int(exponents.min()) + EXACT_SCALE - 53
+    sums = {}
+    for slot in np.flatnonzero(high | low):
+        code, shift = divmod(int(keys[slot]), span)
+        sums[code] = sums.get(code, 0) + (((int(high[slot]) << 26) + int(low[slot])) << (base + shift))
+    return sums
+
+def update_running_means(stats, chunk):
+    """Add a chunk's numeric columns to running {column: (exact sum, count, sum of infinities)} statistics"""
+    for col in chunk.select_dtypes(include=["number"]).columns:
+        values = chunk[col].to_numpy(dtype="float64", na_value=np.nan)
+        values = values[~np.isnan(values)]
+        finite = np.isfinite(values)
+        total, count, infinite = stats.get(col, (0, 0, 0.0))
+        stats[col] = (total + exact_sum(values[finite]), count + len(values), infinite + float(values[~finite].sum()))
+
+def running_means(stats):
+    """Correctly rounded means from update_running_means statistics; columns without values are left out"""
+    means = {}
+    for col, (total, count, infinite) in stats.items():
+        if count:
+            # int / int rounds the exact quotient once
+            means[col] = infinite if infinite else total / (count << EXACT_SCALE)
+    return pd.Series(means, dtype="float64")
+
+def update_group_means(stats, chunk, by):
+    """Add a chunk's numeric columns, other than the keys `by`, to running {column: {group key: statistics}}
+
+    The statistics are those of update_running_means, accumulated per group in
+    one hash pass over the keys.
+    """
+    codes, keys = group_codes(chunk, by)
+    for col in chunk.select_dtypes(include=["number"]).columns.difference(by, sort=False):
+        values = chunk[col].to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~np.isnan(values) & (codes >= 0)
+        values, value_codes = values[valid], codes[valid]
+        finite = np.isfinite(values)
+        sums = exact_group_sums(values[finite], value_codes[finite], len(keys))
+        counts = np.bincount(value_codes, minlength=len(keys))
+        infinities = np.bincount(value_codes[~finite], weights=values[~finite], minlength=len(keys))
+        groups = stats.setdefault(col, {})
+        for code in np.flatnonzero(counts):
+            total, count, infinite = groups.get(keys[code], (0, 0, 0.0))
+            groups[keys[code]] = (total + sums.get(code, 0), count + int(counts[code]), infinite + float(infinities[code]))
+
+def group_means(chunks, by):
+    """Means of the numeric columns per group of the key columns `by`, over a sequence of chunks
+
+    Like column_means, exact: the same however the rows are split into chunks.
+    """
+    stats = {}
+    for chunk in chunks:
+        update_group_means(stats, chunk, by)
+    return group_frame({col: running_means(groups).to_dict() for col, groups in stats.items()}, by)
+
+def column_means(chunks):
+    """Means of the numeric columns over a sequence of chunks
+
+    The sums are exact, so the means are the same however the rows are split
+    into chunks: Fill Missing Values gives identical results in memory and in
+    Streaming Mode.
+    """
+    stats = {}
+    for chunk in chunks:
+        update_running_means(stats, chunk)
+    return running_means(stats)
+
+def make_step(kind, **options):
+    """A plan step: (kind, sorted options), hashable so plans can key caches; None options are left out"""
+    return (kind, tuple(sorted((name, value) for name, value in options.items() if value is not None)))
+
+def as_step(step):
+    """(kind, options) form of a step, which may also be given as a bare kind"""
+    return make_step(step) if isinstance(step, str) else step
+
+def fill_step(strategy="mean", q=0.5, exact=False, by=None):
+    """Fill step for a strategy in FILL_STRATEGIES; `q` is used by "quantile"
+
+    Means are always exact; `exact` makes medians, quantiles and modes exact
+    instead of estimated from sketches (sketches.py). With key columns `by`,
+    statistics are taken, and nulls filled, within each group of rows with
+    equal keys.
+    """
+    if strategy not in FILL_STRATEGIES:
+        raise ValueError(f"Unknown fill strategy: {strategy}")
+    by = tuple(by) if by else None
+    if strategy == "mean":
+        return make_step(FILL_NULLS, by=by)
+    return make_step(FILL_NULLS, strategy=strategy, q=q if strategy == "quantile" else None, exact=exact or None, by=by)
+
+def text_step(ops, columns=None):
+    """Text normalization step for operations in TEXT_OPERATIONS, over the text columns or `columns`"""
+    return make_step(NORMALIZE_TEXT, ops=text_operations(ops), columns=tuple(columns) if columns else None)
+
+def step_label(step):
+    """Human-readable name of a step ("Remove Duplicates by id, date", "Fill Missing Values (median)")"""
+    kind, options = as_step(step)
+    options = dict(options)
+    label = STEP_LABELS[kind]
+    if options.get("subset"):
+        label += " by " + ", ".join(map(str, options["subset"]))
+    if options.get("strategy"):
+        strategy = f"{options['q']:g} quantile" if options["strategy"] == "quantile" else options["strategy"]
+        label += f" ({strategy}{', exact' if options.get('exact') else ''})"
+    if options.get("by"):
+        label += " within " + ", ".join(map(str, options["by"]))
+    if options.get("ops"):
+        label += " (" + ", ".join(TEXT_OPERATIONS[op] for op in options["ops"]) + ")"
+        if options.get("columns"):
+            label += " in " + ", ".join(map(str, options["columns"]))
+    return label
+
+def cleaning_steps(auto_remove_duplicates=False, auto_fill_nulls=False, drop_nulls=False, key_columns=None, drop_seen=False, fill=None, text_ops=None):
+    """Plan for the checkbox options, in the order they have always been applied
+
+    `key_columns` restricts duplicate detection (and the seen-rows lookup) to
+    those columns; `drop_seen` first removes rows remembered from earlier
+    uploads; `fill` holds fill_step arguments (default: mean fill);
+    `text_ops` normalizes text before anything else, so that rows differing
+    only in spacing or case count as duplicates.
+    """
+    subset = tuple(key_columns) if key_columns else None
+    steps = []
+    if text_ops:
+        steps.append(text_step(text_ops))
+    if drop_seen:
+        steps.append(make_step(DROP_SEEN, subset=subset))
+    if auto_remove_duplicates:
+        steps.append(make_step(DROP_DUPLICATES, subset=subset))
+    if auto_fill_nulls:
+        steps.append(fill_step(**(fill or {})))
+    if drop_nulls:
+        steps.append(make_step(DROP_NULLS))
+    return steps
+
+def optimize_plan(steps):
+    """Rewrite a recorded plan into an equivalent one with fewer or cheaper passes
+
+    Remove Null Rows moves ahead of whole-row Remove Duplicates (the two
+    commute, and deduplication then hashes fewer rows), and steps that cannot
+    change the result are dropped: a deduplication implied by an earlier one
+    with only row filters in between (rows unique on some keys are unique on
+    any superset of them), a repeated seen-rows lookup, a fill after the
+    nulls it could fill are gone, a second null removal. Text normalization
+    and fills change values, so deduplications and lookups after them are
+    always kept.
+    """
+    reordered = []
+    for step in map(as_step, steps):
+        pos = len(reordered)
+        if step[0] == DROP_NULLS:
+            while pos and reordered[pos - 1] == make_step(DROP_DUPLICATES):
+                pos -= 1
+        reordered.insert(pos, step)
+
+    optimized = []
+    # Key subsets (None: whole rows) the rows are unique on, and seen-rows lookups done
+    unique_on, looked_up = [], []
+    # Columns left entirely null are never filled, so "no nulls" means "none a fill could fill"
+    no_nulls = no_fillable_nulls = no_numeric_nulls = False
+    for step in reordered:
+        kind, options = step
+        subset = dict(options).get("subset")
+        if kind == DROP_DUPLICATES:
+            if any(subset is None or keys is not None and set(keys) <= set(subset) for keys in unique_on):
+                continue
+            unique_on.append(subset)
+        elif kind == DROP_SEEN:
+            if subset in looked_up:
+                continue
+            looked_up.append(subset)
+        elif kind == DROP_NULLS:
+            if no_nulls:
+                continue
+            no_nulls = no_fillable_nulls = no_numeric_nulls = True
+        elif kind == FILL_NULLS:
+            fills_all = dict(options).get("strategy") == "mode"
+            if no_fillable_nulls or no_numeric_nulls and not fills_all:
+                continue
+            # Filled values can make rows equal, or match remembered ones; a grouped
+            # fill leaves nulls in key columns and in groups without values
+            if not dict(options).get("by"):
+                no_numeric_nulls = True
+                no_fillable_nulls = no_fillable_nulls or fills_all
+            unique_on, looked_up = [], []
+        elif kind == NORMALIZE_TEXT:
+            # Normalized values can make rows equal, or match remembered ones
+            unique_on, looked_up = [], []
+        else:
+            raise ValueError(f"Unknown cleaning step: {kind}")
+        optimized.append(step)
+    return optimized
+
+def fill_statistics(chunks, options):
+    """Fill values, per column, of a fill step with `options` over a sequence of chunks; None if there are none
+
+    Grouped fills get a DataFrame of values per group key instead (see group_frame).
+    """
+    strategy = options.get("strategy", "mean")
+    by = options.get("by")
+    if by:
+        if strategy == "mean":
+            values = group_means(chunks, by)
+        elif strategy == "mode":
+            values = group_modes(chunks, by, options.get("exact", False))
+        else:
+            q = 0.5 if strategy == "median" else options["q"]
+            values = group_quantiles(chunks, by, q, options.get("exact", False))
+    elif strategy == "mean":
+        values = column_means(chunks)
+    elif strategy == "mode":
+        values = column_modes(chunks, options.get("exact", False))
+    else:
+        q = 0.5 if strategy == "median" else options["q"]
+        values = column_quantiles(chunks, q, options.get("exact", False))
+    return None if values.empty else values
+
+def holds_values(series, values):
+    """series, as Float64 if it is a nullable integer column (Int64, int64[pyarrow]...) and some of `values` are not whole"""
+    if isinstance(series.dtype, np.dtype) or not pd.api.types.is_integer_dtype(series.dtype):
+        return series
+    if all(not pd.api.types.is_float(value) or pd.isna(value) or float(value).is_integer() for value in values):
+        return series
+    return series.astype("Float64")
+
+def fill_columns(chunk, fill_values, by=None):
+    """Fill nulls in the columns of chunk that have a fill value
+
+    With key columns `by`, fill_values holds values per group key, which are
+    broadcast to the rows of each group with one index lookup. Only columns
+    that contain nulls are rewritten; the others stay shared with chunk.
+    Nullable integer columns filled with a fraction (a mean, say) become Float64.
+    """
+    names = fill_values.columns if by else fill_values.index
+    cols = [col for col in chunk.columns if col in names and chunk[col].hasnans]
+    if not cols:
+        return chunk
+    filled = chunk.copy(deep=False)
+    rows = group_rows(chunk, fill_values, by) if by else None
+    for col in cols:
+        series = chunk[col]
+        if by:
+            fill = series.isna().to_numpy() & (rows >= 0)
+            values = fill_values[col].to_numpy()[np.maximum(rows, 0)]
+            new_values = pd.unique(values[fill])
+        else:
+            value = fill_values[col]
+            new_values = [value]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            new_values = [value for value in new_values if not pd.isna(value) and value not in series.cat.categories]
+            if new_values:
+                series = series.cat.add_categories(new_values)
+        else:
+            series = holds_values(series, new_values)
+        filled[col] = series.mask(fill, values) if by else series.fillna(value)
+    return filled
+
+def take_rows(chunk, keep):
+    """chunk[keep], without copying when every row is kept"""
+    return chunk if keep.all() else chunk[keep]
+
+def execute_steps(chunk, steps, prepared, counts, offsets=None, masks=None):
+    """Run optimized steps over a whole frame or one chunk of a stream
+
+    Consecutive row filters only combine boolean masks; rows are taken once,
+    before a fill or a text normalization, or at the end. `prepared` maps step positions to what the
+    step needs from outside the frame: a fill's column means (None: no
+    numeric columns), a seen-rows lookup's hash index, or, for a
+    deduplication over a stream, the sorted stream positions of the rows to
+    drop (see spill_duplicates), with `offsets[position]` counting the rows
+    that reached the step in earlier chunks. Missing means and indexes are
+    computed or loaded here; without positions, duplicates are found within
+    the frame. Removed rows are added to counts[position], and, with `masks`
+    given, masks[position] is a row filter's keep mask over the rows of chunk
+    as it was after the last fill or normalization before it.
+    """
+    keep = None
+    for pos, (kind, options) in enumerate(steps):
+        subset = dict(options).get("subset")
+        if kind == FILL_NULLS:
+            if keep is not None:
+                chunk, keep = take_rows(chunk, keep), None
+            if pos not in prepared:
+                prepared[pos] = fill_statistics([chunk], dict(options))
+            if prepared[pos] is not None:
+                chunk = fill_columns(chunk, prepared[pos], dict(options).get("by"))
+            continue
+
+        if kind == NORMALIZE_TEXT:
+            if keep is not None:
+                chunk, keep = take_rows(chunk, keep), None
+            options = dict(options)
+            chunk, changed = normalize_text(chunk, options["ops"], options.get("columns"))
+            counts[pos] = counts.get(pos, 0) + changed
+            continue
+
+        if kind == DROP_NULLS:
+            mask = chunk.notna().all(axis=1).to_numpy()
+        elif kind == DROP_SEEN:
+            if pos not in prepared:
+                prepared[pos] = load_hash_index(subset)
+            mask = ~in_hash_index(key_hashes(chunk, subset), prepared[pos])
+        elif pos in prepared:
+            # Row numbers, and positions in the step's input stream, of the rows reaching it
+            rows = np.arange(len(chunk)) if keep is None else np.flatnonzero(keep)
+            start = offsets.get(pos, 0)
+            offsets[pos] = start + len(rows)
+            dropped = prepared[pos]
+            dropped = dropped[np.searchsorted(dropped, start):np.searchsorted(dropped, start + len(rows))]
+            mask = np.ones(len(chunk), dtype=bool)
+            mask[rows[dropped - start]] = False
+        elif keep is None or subset is None:
+            # Only null removal can precede a whole-row deduplication here, and it never
+            # drops the first of a set of equal rows that survives, so flags stay exact
+            mask = ~chunk.duplicated(subset=list(subset) if subset else None).to_numpy()
+        else:
+            mask = np.ones(len(chunk), dtype=bool)
+            mask[np.flatnonzero(keep)] = ~chunk[list(subset)][keep].duplicated().to_numpy()
+        removed = ~mask if keep is None else keep & ~mask
+        keep = mask if keep is None else keep & mask
+        counts[pos] = counts.get(pos, 0) + int(removed.sum())
+        if masks is not None:
+            masks[pos] = mask
+
+    if keep is not None:
+        chunk = take_rows(chunk, keep)
+    return chunk
+
+def fill_message(options, filled):
+    """(level, text) message for a fill step; `filled` is False when there was nothing to fill with"""
+    strategy = options.get("strategy", "mean")
+    if strategy == "mode":
+        if not filled:
+            return ("warning", "No values available to fill missing values.")
+        text = "Filled missing values with each column's most frequent value"
+    else:
+        if not filled:
+            return ("warning", "No numeric columns available to fill missing values.")
+        statistic = {"mean": "column means", "median": "column medians"}.get(strategy, f"each column's {options.get('q', 0.5):g} quantile")
+        text = f"Filled missing numeric values with {statistic}"
+    if options.get("by"):
+        text += " within groups of " + ", ".join(map(str, options["by"]))
+    estimated = strategy != "mean" and not options.get("exact")
+    return ("success", text + (" (estimated from sketches)." if estimated else "."))
+
+def plan_messages(steps, counts, prepared):
+    """(level, text) messages for an executed plan, one per step"""
+    messages = []
+    for pos, (kind, options) in enumerate(steps):
+        subset = dict(options).get("subset")
+        if kind == DROP_DUPLICATES:
+            keys = f" (by {', '.join(map(str, subset))})" if subset else ""
+            messages.append(("success", f"Removed {counts.get(pos, 0)} duplicate rows{keys}."))
+        elif kind == DROP_SEEN:
+            messages.append(("success", f"Removed {counts.get(pos, 0)} rows seen in earlier uploads."))
+        elif kind == DROP_NULLS:
+            messages.append(("success", f"Removed {counts.get(pos, 0)} rows with null values."))
+        elif kind == NORMALIZE_TEXT:
+            messages.append(("success", f"Normalized {counts.get(pos, 0)} text values."))
+        else:
+            messages.append(fill_message(dict(options), prepared.get(pos) is not None))
+    return messages
+
+def run_plan(df, steps):
+    """Optimize a recorded plan and run it over df in one pass; returns (cleaned frame, messages)
+
+    df itself is never modified, and columns the plan does not change are shared
+    with it rather than copied.
+    """
+    steps = optimize_plan(steps)
+    counts, prepared = {}, {}
+    df_cleaned = execute_steps(df, steps, prepared, counts)
+    return df_cleaned, plan_messages(steps, counts, prepared)
+
+def run_plan_chunks(make_chunks, steps, messages=None, dedup_buckets=DEDUP_BUCKETS):
+    """Generator version of run_plan.
+
+    `make_chunks` returns a fresh chunk iterator on every call: each fill and
+    deduplication step first makes a pass over the stream, cleaned up to that
+    step, for its fill values (mergeable summaries built over chunks in
+    parallel) or for the positions of its duplicates. Duplicates are
+    found out of core (spill_duplicates with `dedup_buckets` buckets, over the
+    key columns only), so the stream never has to fit in memory. Messages are
+    appended to `messages` once the stream is exhausted.
+    """
+    if messages is None:
+        messages = []
+    steps = optimize_plan(steps)
+
+    def cleaned(upto, counts):
+        offsets = {}
+        for chunk in make_chunks():
+            yield execute_steps(chunk, steps[:upto], prepared, counts, offsets)
+
+    prepared = {}
+    for pos, (kind, options) in enumerate(steps):
+        if kind == FILL_NULLS:
+            prepared[pos] = fill_statistics(cleaned(pos, {}), dict(options))
+        elif kind == DROP_DUPLICATES:
+            subset = dict(options).get("subset")
+            chunks = cleaned(pos, {})
+            if subset:
+                chunks = (chunk[list(subset)] for chunk in chunks)
+            prepared[pos] = spill_duplicates(chunks, dedup_buckets)
+
+    counts = {}
+    yield from cleaned(len(steps), counts)
+    messages.extend(plan_messages(steps, counts, prepared))
+
+@contextmanager
+def track_allocations(report, label):
+    """Append (label, bytes allocated inside the block) to report
+
+    NumPy buffers are traced with tracemalloc (which slows the block down);
+    growth of pyarrow's memory pool, used by Arrow-backed columns, is added.
+    Both are process-wide: allocations by other threads (other sessions)
+    during the block are counted too. tracemalloc is started for the first
+    block in flight and stopped after the last one, and only if it was not
+    already tracing. When the block is the only one measuring on tracing it
+    started, the figure is the block's peak; otherwise resetting the shared
+    peak would distort the other measurements, so it is the growth of traced
+    memory over the block. With report None nothing is measured.
+    """
+    if report is None:
+        yield
+        return
+    with _tracing_lock:
+        if not _tracing["blocks"] and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing["started"] = True
+        _tracing["blocks"] += 1
+        alone = _tracing["blocks"] == 1 and _tracing["started"]
+        if alone:
+            tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+    arrow_base = pyarrow.total_allocated_bytes() if HAS_PYARROW else 0
+    try:
+        yield
+    finally:
+        arrow = pyarrow.total_allocated_bytes() - arrow_base if HAS_PYARROW else 0
+        with _tracing_lock:
+            current, peak = tracemalloc.get_traced_memory()
+            _tracing["blocks"] -= 1
+            if not _tracing["blocks"] and _tracing["started"]:
+                tracemalloc.stop()
+                _tracing["started"] = False
+        traced = peak - base if alone else current - base
+        report.append((label, max(traced, 0) + max(arrow, 0)))
+
+def clean_frame(df, auto_remove_duplicates=False, auto_fill_nulls=False):
+    """Apply the cleaning options to df; returns (cleaned frame, messages)"""
+    return run_plan(df, cleaning_steps(auto_remove_duplicates, auto_fill_nulls))
+
+def clean_chunks(make_chunks, auto_remove_duplicates=False, auto_fill_nulls=False, drop_nulls=False, messages=None, key_columns=None, drop_seen=False, fill=None, text_ops=None):
+    """Generator version of clean_frame, with the other cleaning_steps options"""
+    steps = cleaning_steps(auto_remove_duplicates, auto_fill_nulls, drop_nulls, key_columns, drop_seen, fill, text_ops)
+    return run_plan_chunks(make_chunks, steps, messages)
@@ -0,0 +1,236 @@
+"""Duplicate detection for Data Sweeper: out of core, and across uploads
+
+Rows are hashed with pd.util.hash_pandas_object and partitioned by hash into
+on-disk buckets; equal rows always land in the same bucket, so each bucket can
+then be deduplicated on its own, exactly.
+
+Rows can also be remembered in a persisted index of their hashes (a sorted
+uint64 array per set of key columns), so a later upload drops rows seen before
+with one vectorized lookup. Values are hashed the same however they were
+typed when read, and numbers as integers wherever they are whole, so large
+integer IDs stay distinct; with 64-bit hashes, a distinct
+row is wrongly dropped with probability about n / 2**64 for an index of n rows.
+"""
+import os
+import pickle
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Hash buckets rows are spilled into; memory use is bounded by the largest bucket
+DEDUP_BUCKETS = 64
+DEDUP_SPILL_DIR = os.path.join(tempfile.gettempdir(), "data_sweeper_dedup")
+
+# Persisted row-hash indexes for incremental deduplication across uploads; the
+# version changes whenever key_hashes does, so older indexes are not matched
+HASH_INDEX_DIR = os.environ.get(
+    "DATA_SWEEPER_INDEX_DIR",
+    os.path.join(tempfile.gettempdir(), "data_sweeper_index")
+)
+HASH_INDEX_VERSION = 3
+
+# key_hashes: dates hash with their own key so they never equal a number's hash;
+# nulls hash alike whatever the column's dtype
+DATE_HASH_KEY = "data-sweeper-dt0"
+NULL_HASH = pd.util.hash_array(np.array([np.nan]))[0]
+ISO_DATE_RE = r"\d{4}-\d{2}-\d{2}"
+
+def row_hashes(chunk):
+    """64-bit hash per row, stable across chunks whose numeric dtypes differ"""
+    numeric_cols = chunk.select_dtypes(include=["number", "bool"]).columns
+    if not numeric_cols.empty:
+        # A column read as int64 in one chunk may be float64 in another (NaNs)
+        chunk = chunk.astype({col: "float64" for col in numeric_cols})
+    return pd.util.hash_pandas_object(chunk, index=False)
+
+def partition_rows(chunk, buckets):
+    """Yield (bucket, row numbers) for the non-empty hash buckets of a chunk, rows in order"""
+    bucket_of = row_hashes(chunk).to_numpy() % buckets
+    order = np.argsort(bucket_of, kind="stable")
+    bounds = np.searchsorted(bucket_of[order], np.arange(buckets + 1))
+    for bucket in range(buckets):
+        if bounds[bucket] < bounds[bucket + 1]:
+            yield bucket, order[bounds[bucket]:bounds[bucket + 1]]
+
+def load_spilled(path):
+    """Concatenate the frames appended to a spill file"""
+    parts = []
+    with open(path, "rb") as handle:
+        while True:
+            try:
+                parts.append(pickle.load(handle))
+            except EOFError:
+                break
+    return pd.concat(parts) if len(parts) > 1 else parts[0]
+
+def spill_duplicates(chunks, buckets=DEDUP_BUCKETS):
+    """Positions in the stream of the rows that repeat an earlier row, as a sorted int64 array
+
+    The first pass appends each chunk's rows, indexed by their stream position,
+    to the spill file of their hash bucket. The second loads one bucket at a
+    time and flags its duplicates with DataFrame.duplicated, so hash
+    collisions never drop a distinct row. Only the duplicate positions (8 bytes
+    each) are kept in memory afterwards.
+    """
+    os.makedirs(DEDUP_SPILL_DIR, exist_ok=True)
+    duplicates = []
+    with tempfile.TemporaryDirectory(dir=DEDUP_SPILL_DIR) as directory:
+        handles = {}
+        try:
+            offset = 0
+            for chunk in chunks:
+                for bucket, rows in partition_rows(chunk, buckets):
+                    part = chunk.iloc[rows]
+                    part.index = offset + rows
+                    if bucket not in handles:
+                        handles[bucket] = open(os.path.join(directory, f"{bucket}.pkl"), "wb")
+                    pickle.dump(part, handles[bucket], pickle.HIGHEST_PROTOCOL)
+                offset += len(chunk)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        for bucket in sorted(handles):
+            rows = load_spilled(os.path.join(directory, f"{bucket}.pkl"))
+            duplicates.append(rows.index[rows.duplicated()].to_numpy(dtype="int64"))
+
+    positions = np.concatenate(duplicates) if duplicates else np.empty(0, dtype="int64")
+    positions.sort()
+    return positions
+
+def number_hashes(series):
+    """64-bit hash per value of a numeric or boolean column, equal for equal numbers whatever the dtype
+
+    Whole numbers hash as 64-bit integers (a float64 cast would merge integers
+    above 2**53), booleans as 0 and 1, other floats and nulls as float64.
+    """
+    floats = series.to_numpy(dtype="float64", na_value=np.nan)
+    hashes = pd.util.hash_array(floats)
+    if pd.api.types.is_integer_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        valid = series.notna().to_numpy()
+        dtype = series.dtype.numpy_dtype if hasattr(series.dtype, "numpy_dtype") else series.dtype
+        width = np.uint64 if pd.api.types.is_unsigned_integer_dtype(dtype) else np.int64
+        hashes[valid] = pd.util.hash_array(series[valid].to_numpy(dtype=width))
+        return hashes
+    whole = np.isfinite(floats) & (floats == np.trunc(floats)) & (np.abs(floats) < 2.0 ** 63)
+    hashes[whole] = pd.util.hash_array(floats[whole].astype(np.int64))
+    return hashes
+
+def date_hashes(series):
+    """64-bit hash per value of a datetime column: its nanoseconds since the epoch (in UTC for zoned values)"""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+    nanoseconds = series.astype("datetime64[ns]").to_numpy().view(np.int64)
+    hashes = pd.util.hash_array(nanoseconds, hash_key=DATE_HASH_KEY)
+    hashes[series.isna().to_numpy()] = NULL_HASH
+    return hashes
+
+def text_hashes(series):
+    """64-bit hash per value of a text column, as str
+
+    "true"/"false" (any case) and ISO-8601 dates hash like the booleans and
+    datetimes Compact Dtypes parses them into.
+    """
+    valid = series.notna().to_numpy()
+    text = series[valid].astype(str).astype(object)
+    hashes = pd.util.hash_array(text.to_numpy(dtype=object))
+    lowered = text.str.lower()
+    flags = lowered.isin(["true", "false"]).to_numpy()
+    hashes[flags] = pd.util.hash_array((lowered[flags] == "true").to_numpy(dtype=np.int64))
+    dated = text.str.match(ISO_DATE_RE).to_numpy(dtype=bool) & ~flags
+    if dated.any():
+        parsed = pd.to_datetime(text[dated], format="ISO8601", errors="coerce", utc=True)
+        ok = parsed.notna().to_numpy()
+        hashes[np.flatnonzero(dated)[ok]] = date_hashes(parsed[ok])
+    result = np.full(len(series), NULL_HASH, dtype=np.uint64)
+    result[valid] = hashes
+    return result
+
+def value_hashes(series):
+    """64-bit hash per value of a column that does not depend on how the column was typed when it was read
+
+    Compact Dtypes turns text into booleans, datetimes and categoricals and
+    narrows numbers, Streaming Mode keeps text; either way, a value hashes
+    the same (see number_hashes, date_hashes and text_hashes; nulls all hash
+    alike).
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = value_hashes(series.cat.categories.to_series())
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, categories[np.maximum(codes, 0)], NULL_HASH).astype(np.uint64)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return date_hashes(series)
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return number_hashes(series)
+    return text_hashes(series)
+
+def key_hashes(chunk, subset=None):
+    """Row hashes of chunk over the key columns `subset` (None: whole rows), as a uint64 array
+
+    Unlike row_hashes, which only buckets rows that are then compared
+    exactly, these are the only record of remembered rows, so each value is
+    hashed in full and in a form that does not depend on the read mode (see
+    value_hashes).
+    """
+    keys = chunk if subset is None else chunk[list(subset)]
+    hashed = pd.DataFrame({i: value_hashes(keys.iloc[:, i]) for i in range(keys.shape[1])}, index=keys.index)
+    return pd.util.hash_pandas_object(hashed, index=False).to_numpy()
+
+def hash_index_path(subset=None):
+    """Index file for a set of key columns: uploads deduplicated on the same keys share history"""
+    key = hashlib.sha256(repr((HASH_INDEX_VERSION, tuple(subset) if subset else None)).encode()).hexdigest()
+    return os.path.join(HASH_INDEX_DIR, f"{key}.npy")
+
+def load_hash_index(subset=None):
+    """Sorted, unique row hashes remembered for `subset`; empty if nothing was remembered"""
+    try:
+        return np.load(hash_index_path(subset))
+    except (OSError, ValueError):
+        return np.empty(0, dtype="uint64")
+
+def in_hash_index(hashes, index):
+    """Boolean array: which of `hashes` are in the sorted `index`, in one vectorized lookup"""
+    if not len(index):
+        return np.zeros(len(hashes), dtype=bool)
+    found = np.searchsorted(index, hashes)
+    found[found == len(index)] = 0
+    return index[found] == hashes
+
+def remember_hashes(hashes, subset=None):
+    """Merge arrays of key hashes into the persisted index for `subset`; returns how many were new"""
+    index = load_hash_index(subset)
+    before = len(index)
+    if hashes:
+        index = np.union1d(index, np.concatenate(hashes))
+    os.makedirs(HASH_INDEX_DIR, exist_ok=True)
+    path = hash_index_path(subset)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, index)
+    os.replace(tmp_path, path)
+    return len(index) - before
+
+def remember_rows(chunks, subset=None):
+    """Add the key hashes of chunks to the persisted index for `subset`; returns how many were new"""
+    return remember_hashes([key_hashes(chunk, subset) for chunk in chunks], subset)
+
+def remembering(chunks, subset=None, counter=None):
+    """Pass chunks through, remembering their key hashes once the stream ends
+
+    The number of new hashes is stored in counter["remembered"].
+    """
+    hashes = []
+    for chunk in chunks:
+        hashes.append(key_hashes(chunk, subset))
+        yield chunk
+    remembered = remember_hashes(hashes, subset)
+    if counter is not None:
+        counter["remembered"] = remembered
+
+def forget_rows(subset=None):
+    """Delete the persisted index for `subset`"""
+    try:
+        os.remove(hash_index_path(subset))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,48 @@
+"""Group keys for Data Sweeper's group-wise fills
+
+Rows are grouped by the values of one or more key columns; rows with a null
+in any key column belong to no group. Keys are plain values (categories are
+compared by value), so the groups of different chunks can be matched up.
+"""
+import numpy as np
+import pandas as pd
+
+def group_index(chunk, by):
+    """Index of each row's group key: an Index for one key column, a MultiIndex for several"""
+    arrays = [
+        chunk[col].to_numpy() if isinstance(chunk[col].dtype, pd.CategoricalDtype) else chunk[col]
+        for col in by
+    ]
+    if len(arrays) == 1:
+        return pd.Index(arrays[0], name=by[0])
+    return pd.MultiIndex.from_arrays(arrays, names=list(by))
+
+def group_codes(chunk, by):
+    """(codes, keys): each row's group number in one hash pass, -1 for rows with a null key, and the groups' keys"""
+    codes, keys = pd.factorize(group_index(chunk, by))
+    codes = codes.astype(np.int64)
+    codes[chunk[list(by)].isna().any(axis=1).to_numpy()] = -1
+    return codes, keys
+
+def group_slices(codes, groups):
+    """Yield (group, row numbers) for the groups of `codes` (0 to groups - 1) that have rows"""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(groups + 1))
+    for group in range(groups):
+        if bounds[group] < bounds[group + 1]:
+            yield group, order[bounds[group]:bounds[group + 1]]
+
+def group_frame(stats, by):
+    """DataFrame of per-group statistics from {column: {group key: value}}, indexed by group key"""
+    frame = pd.DataFrame({col: pd.Series(values, dtype="object") for col, values in stats.items() if values})
+    if frame.empty:
+        return frame
+    if len(by) == 1:
+        frame.index = pd.Index(frame.index, name=by[0])
+    else:
+        frame.index = pd.MultiIndex.from_tuples(frame.index, names=list(by))
+    return frame.infer_objects()
+
+def group_rows(chunk, values, by):
+    """Row of `values` (indexed by group key) holding each row's group, -1 where there is none"""
+    return values.index.get_indexer(group_index(chunk, by))
@@ -0,0 +1,158 @@
+"""Undo/redo history of Data Sweeper's cleaning steps, stored as compact deltas
+
+A history records, for each step applied to a frame, only what the step
+changed: a row filter keeps a bit-packed mask of the rows it removed (one bit
+per row it saw), a fill keeps its fill value per column, or per column and
+group (every null it filled in a column, or group, got that value, so the
+filled cells are implied), and a text
+normalization, which needs nothing beyond each value, keeps just the step.
+Removing previously seen rows also keeps the key hashes of the rows it
+removed: the persisted index changes (Remember These Rows adds the file's
+own rows), so the step is never checked against it again.
+Frames at any point of the history are rebuilt by replaying deltas over the
+base frame, which only takes rows, fills nulls and normalizes text again; no
+deduplication or statistic is recomputed and no intermediate frame is kept.
+"""
+import numpy as np
+
+from cleaning import FILL_NULLS, NORMALIZE_TEXT, DROP_SEEN, optimize_plan, execute_steps, plan_messages, fill_columns, take_rows, step_label
+from dedup import key_hashes
+
+def new_history():
+    """Empty history: steps with their deltas and messages, and the position undo/redo moves"""
+    return {"steps": [], "deltas": [], "messages": [], "position": 0, "base": None, "frame": None, "at": 0}
+
+def step_delta(df, step, seen=None):
+    """Run one step over df; returns (cleaned frame, delta, messages)
+
+    A delta is None (nothing changed), ("rows", packed removed-row bits, row
+    count), ("seen", packed removed-row bits, row count, sorted key hashes of
+    the removed rows), ("fill", fill values per column, group key columns) or
+    ("step", step) for steps replayed as they are. A seen-rows step checks
+    rows against the sorted key hashes `seen` instead of the persisted index
+    when given.
+    """
+    counts, prepared, masks = {}, {} if seen is None else {0: seen}, {}
+    cleaned = execute_steps(df, [step], prepared, counts, masks=masks)
+    messages = plan_messages([step], counts, prepared)
+    if step[0] == FILL_NULLS:
+        delta = None if prepared[0] is None or cleaned is df else ("fill", prepared[0], dict(step[1]).get("by"))
+    elif step[0] == NORMALIZE_TEXT:
+        delta = ("step", step) if counts[0] else None
+    elif counts[0] and step[0] == DROP_SEEN:
+        removed = ~masks[0]
+        hashes = np.unique(key_hashes(take_rows(df, removed), dict(step[1]).get("subset")))
+        delta = ("seen", np.packbits(removed), len(df), hashes)
+    elif counts[0]:
+        delta = ("rows", np.packbits(~masks[0]), len(df))
+    else:
+        delta = None
+    return cleaned, delta, messages
+
+def apply_delta(df, delta):
+    """Redo a step on df, the frame it was recorded on, from its delta"""
+    if delta is None:
+        return df
+    if delta[0] == "fill":
+        return fill_columns(df, delta[1], delta[2])
+    if delta[0] == "step":
+        return execute_steps(df, [delta[1]], {}, {})
+    _, removed, rows = delta[:3]
+    return take_rows(df, ~np.unpackbits(removed, count=rows).astype(bool))
+
+def delta_nbytes(delta):
+    """Memory held by a delta, in bytes"""
+    if delta is None or delta[0] == "step":
+        return 0
+    if delta[0] == "fill":
+        return int(np.sum(delta[1].memory_usage(deep=True)))
+    if delta[0] == "seen":
+        return delta[1].nbytes + delta[3].nbytes
+    return delta[1].nbytes
+
+def history_nbytes(history):
+    """Memory held by all deltas of a history, in bytes"""
+    return sum(delta_nbytes(delta) for delta in history["deltas"])
+
+def record_deltas(history, df):
+    """Recompute every delta of the history over a new base frame df
+
+    Seen-rows steps remove the rows whose keys they removed before, not the
+    rows in the persisted index now.
+    """
+    old_deltas = history["deltas"]
+    history["deltas"], history["messages"] = [], []
+    frame = df
+    for step, old in zip(history["steps"], old_deltas):
+        seen = None
+        if step[0] == DROP_SEEN:
+            seen = old[3] if old is not None else np.empty(0, dtype="uint64")
+        frame, delta, messages = step_delta(frame, step, seen)
+        history["deltas"].append(delta)
+        history["messages"].append(messages)
+    history["base"], history["frame"], history["at"] = df, df, 0
+
+def history_frame(history, df):
+    """Frame at the history's position, with df as the base frame
+
+    Deltas are recomputed when df is not the frame they were recorded on
+    (a file re-read with other columns). Moving forward replays the deltas
+    in between on the current frame; moving back replays from the base.
+    """
+    if history["base"] is not df:
+        record_deltas(history, df)
+    position = history["position"]
+    if history["at"] > position:
+        history["frame"], history["at"] = df, 0
+    frame = history["frame"]
+    for delta in history["deltas"][history["at"]:position]:
+        frame = apply_delta(frame, delta)
+    history["frame"], history["at"] = frame, position
+    return frame
+
+def record_step(history, df, step):
+    """Apply step after the history's position, dropping the steps that could be redone; returns messages
+
+    A step the plan optimizer finds has nothing left to do is recorded
+    without running it.
+    """
+    frame = history_frame(history, df)
+    applied = history["steps"][:history["position"]]
+    if len(optimize_plan(applied + [step])) == len(optimize_plan(applied)):
+        cleaned, delta, messages = frame, None, [("info", f"{step_label(step)}: nothing to do.")]
+    else:
+        cleaned, delta, messages = step_delta(frame, step)
+    position = history["position"]
+    for key in ("steps", "deltas", "messages"):
+        del history[key][position:]
+    history["steps"].append(step)
+    history["deltas"].append(delta)
+    history["messages"].append(messages)
+    history["position"], history["frame"], history["at"] = position + 1, cleaned, position + 1
+    return messages
+
+def undo(history):
+    """Step back one step; returns whether there was one"""
+    if history["position"] == 0:
+        return False
+    history["position"] -= 1
+    return True
+
+def redo(history):
+    """Step forward one undone step; returns whether there was one"""
+    if history["position"] == len(history["steps"]):
+        return False
+    history["position"] += 1
+    return True
+
+def reset_history(history):
+    """Forget every step"""
+    history.update(new_history())
+
+def applied_steps(history):
+    """Steps in effect at the history's position"""
+    return history["steps"][:history["position"]]
+
+def applied_messages(history):
+    """Messages of the steps in effect at the history's position"""
+    return [message for messages in history["messages"][:history["position"]] for message in messages]
@@ -1,10 +1,75 @@
 import streamlit as st
 import pandas as pd
 import os
-from io import BytesIO
-import zipfile
+import tempfile
+import threading
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
+from readers import (
+    HAS_PYARROW,
+    HAS_CALAMINE,
+    HAS_ZSTANDARD,
+    CSV_ENGINES,
+    EXCEL_ENGINES,
+    COLUMNAR_EXTENSIONS,
+    CSV_EXTENSIONS,
+    COMPRESSIONS,
+    upload_extension,
+    upload_stem,
+    load_frame,
+    read_file_chunks,
+    read_columns,
+    spool_upload,
+    remove_spooled,
+    remove_stale_spools,
+)
+from cleaning import (
+    DROP_DUPLICATES,
+    DROP_NULLS,
+    DROP_SEEN,
+    FILL_STRATEGIES,
+    make_step,
+    fill_step,
+    text_step,
+    step_label,
+    cleaning_steps,
+    run_plan,
+    clean_chunks,
+    track_allocations,
+)
+from dedup import remember_rows, remembering, forget_rows
+from normalize import TEXT_OPERATIONS
+from history import (
+    new_history,
+    history_frame,
+    record_step,
+    undo,
+    redo,
+    reset_history,
+    applied_steps,
+    applied_messages,
+    history_nbytes,
+)
+from parallel import process_upload, make_pool
+from writers import (
+    HAS_XLSXWRITER,
+    EXCEL_WRITERS,
+    EXCEL_MAX_ROWS,
+    EXCEL_SPLITS,
+    COLUMNAR_FORMATS,
+    PARQUET_CODECS,
+    IPC_CODECS,
+    ROW_GROUP_ROWS,
+    OUTPUT_EXTENSIONS,
+    frame_chunks,
+    write_chunks,
+    new_bulk_zip,
+    add_zip_entry,
+    close_bulk_zip,
+)
+
 # Page configuration
 st.set_page_config(
     page_title="Data Sweeper",
@@ -41,6 +106,30 @@ if 'chart_type' not in st.session_state:
     st.session_state.chart_type = "Bar Chart"
 if 'default_cleaning' not in st.session_state:
     st.session_state.default_cleaning = True
+if 'streaming_mode' not in st.session_state:
+    st.session_state.streaming_mode = False
+if 'chunk_size' not in st.session_state:
+    st.session_state.chunk_size = 100_000
+if 'csv_engine' not in st.session_state:
+    st.session_state.csv_engine = "Auto"
+if 'excel_engine' not in st.session_state:
+    st.session_state.excel_engine = "Auto"
+if 'excel_writer' not in st.session_state:
+    st.session_state.excel_writer = "Auto"
+if 'compact_dtypes' not in st.session_state:
+    st.session_state.compact_dtypes = True
+if 'dtype_sample_rows' not in st.session_state:
+    st.session_state.dtype_sample_rows = 10_000
+if 'spool_mb' not in st.session_state:
+    st.session_state.spool_mb = 100
+if 'parallel_workers' not in st.session_state:
+    st.session_state.parallel_workers = min(4, os.cpu_count() or 1)
+if 'disk_cache' not in st.session_state:
+    st.session_state.disk_cache = HAS_PYARROW
+if 'disk_cache_mb' not in st.session_state:
+    st.session_state.disk_cache_mb = 2048
+if 'show_memory' not in st.session_state:
+    st.session_state.show_memory = False
 
 # Sidebar
 with st.sidebar:
@@ -61,6 +150,90 @@ with st.sidebar:
         value=st.session_state.auto_fill_nulls
     )
     
+    # Performance preferences
+    st.subheader("Performance Settings")
+    st.session_state.streaming_mode = st.checkbox(
+        "Streaming Mode for Large Files",
+        value=st.session_state.streaming_mode,
+        help="Process files in fixed-size chunks so memory use depends on the chunk size, not the file size."
+    )
+    st.session_state.chunk_size = st.number_input(
+        "Chunk Size (rows)",
+        min_value=1_000,
+        max_value=5_000_000,
+        step=10_000,
+        value=st.session_state.chunk_size,
+        disabled=not st.session_state.streaming_mode
+    )
+    st.session_state.csv_engine = st.selectbox(
+        "CSV Parser Engine",
+        CSV_ENGINES,
+        index=CSV_ENGINES.index(st.session_state.csv_engine),
+        help="Auto uses the multi-threaded PyArrow parser for large files and the C parser otherwise."
+    )
+    if st.session_state.csv_engine == "PyArrow" and not HAS_PYARROW:
+        st.warning("PyArrow is not installed; falling back to the C parser.")
+    st.session_state.excel_engine = st.selectbox(
+        "Excel Reader Engine",
+        EXCEL_ENGINES,
+        index=EXCEL_ENGINES.index(st.session_state.excel_engine),
+        help="Auto uses calamine when installed, otherwise openpyxl read-only streaming for large workbooks."
+    )
+    if st.session_state.excel_engine == "Calamine" and not HAS_CALAMINE:
+        st.warning("python-calamine is not installed; falling back to openpyxl read-only mode.")
+    st.session_state.excel_writer = st.selectbox(
+        "Excel Writer Engine",
+        EXCEL_WRITERS,
+        index=EXCEL_WRITERS.index(st.session_state.excel_writer),
+        help="Auto uses xlsxwriter's constant-memory mode, which streams rows to disk, for large outputs when installed."
+    )
+    if st.session_state.excel_writer != "openpyxl" and not HAS_XLSXWRITER:
+        st.warning("xlsxwriter is not installed; Excel files are written with openpyxl.")
+    st.session_state.parallel_workers = st.number_input(
+        "Parallel Workers",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=min(st.session_state.parallel_workers, os.cpu_count() or 1),
+        help="Worker processes used to parse and clean several uploaded files at once. 1 processes files one by one."
+    )
+    st.session_state.spool_mb = st.number_input(
+        "Spool Uploads to Disk Above (MB)",
+        min_value=0,
+        step=50,
+        value=st.session_state.spool_mb,
+        help="Larger uploads are copied to a temporary file once and parsed from a memory-mapped file."
+    )
+    st.session_state.compact_dtypes = st.checkbox(
+        "Compact Dtypes",
+        value=st.session_state.compact_dtypes,
+        help="Infer dtypes from a sample of rows, store low-cardinality text as categories and narrow numeric columns."
+    )
+    st.session_state.dtype_sample_rows = st.number_input(
+        "Dtype Sample Rows",
+        min_value=100,
+        step=1_000,
+        value=st.session_state.dtype_sample_rows,
+        disabled=not st.session_state.compact_dtypes
+    )
+    st.session_state.disk_cache = st.checkbox(
+        "Disk Parse Cache",
+        value=st.session_state.disk_cache,
+        disabled=not HAS_PYARROW,
+        help="Keep parsed files on disk as Parquet, keyed by a hash of the upload, so repeat uploads skip parsing."
+    )
+    st.session_state.disk_cache_mb = st.number_input(
+        "Cache Size Limit (MB)",
+        min_value=64,
+        step=256,
+        value=st.session_state.disk_cache_mb,
+        disabled=not st.session_state.disk_cache
+    )
+    st.session_state.show_memory = st.checkbox(
+        "Show Memory Use",
+        value=st.session_state.show_memory,
+        help="Show the memory allocated by each reading, cleaning and selection step (traced, so slower)."
+    )
+    
     # Visualization preferences
     st.subheader("Visualization Settings")
     chart_type = st.selectbox(
@@ -78,208 +251,653 @@ with st.sidebar:
     st.markdown("### About Data Sweeper")
     st.markdown("""
     Data Sweeper is a powerful tool for:
-    - Converting between CSV and Excel formats
+    - Converting between CSV and Excel formats, or to Parquet, Feather and Arrow
     - Cleaning and preprocessing data
     - Visualizing data patterns
-    - Batch processing multiple files
+    - Batch processing multiple files, with one ZIP download for all of them
+    - Streaming files larger than memory in chunks
     """)
 
 # Main content
 st.title("🧹 Data Sweeper")
 st.markdown("### Transform and Clean Your Data Files")
 
-@st.cache_data
-def read_file(file, ext):
+# Frames are cached with st.cache_resource, which returns the cached object itself
+# rather than an unpickled copy on every rerun; under copy-on-write no caller can
+# modify it through a derived frame.
+@st.cache_resource
+def read_file(file, ext, engine="Auto", disk_cache_bytes=0, excel_engine="Auto", dtype_sample_rows=0, usecols=None):
     """Cached function to read files"""
-    try:
-        if ext == ".csv":
-            return pd.read_csv(file, low_memory=False)
-        elif ext == ".xlsx":
-            return pd.read_excel(file)
-    except Exception as e:
-        st.error(f"Error reading file {file.name}: {e}")
-        return None
+    return load_frame(file, ext, engine, disk_cache_bytes, excel_engine, dtype_sample_rows, usecols)
 
 @st.cache_data
-def clean_data(df, auto_remove_duplicates=False, auto_fill_nulls=False):
-    """Cached function for data cleaning operations"""
-    df_cleaned = df.copy()
-    
-    if auto_remove_duplicates:
-        before = df_cleaned.shape[0]
-        df_cleaned = df_cleaned.drop_duplicates()
-        after = df_cleaned.shape[0]
-        st.success(f"Removed {before - after} duplicate rows.")
-    
-    if auto_fill_nulls:
-        numeric_cols = df_cleaned.select_dtypes(include=["number"]).columns
-        if not numeric_cols.empty:
-            df_cleaned[numeric_cols] = df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].mean())
-            st.success("Filled missing numeric values with column means.")
-        else:
-            st.warning("No numeric columns available to fill missing values.")
-    
-    return df_cleaned
+def file_columns(file, ext):
+    """Cached function to read a file's column names from its header"""
+    try:
+        return read_columns(file, ext)
+    except Exception:
+        return []
 
-@st.cache_data
-def convert_file(df, conversion_type):
-    """Cached function for file conversion"""
-    buffer = BytesIO()
-    if conversion_type == "CSV":
-        df.to_csv(buffer, index=False)
-        mime = "text/csv"
-    else:
-        df.to_excel(buffer, index=False)
-        mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    buffer.seek(0)
-    return buffer.getvalue(), mime
+@st.cache_resource
+def worker_pools():
+    """The worker process pool shared by all sessions and its worker count, guarded by a lock"""
+    return {"lock": threading.Lock(), "workers": 0, "pool": None}
+
+def get_worker_pool(workers):
+    """Worker process pool shared by all sessions, with `workers` processes
+
+    The pool for another worker count is shut down once the work already
+    submitted to it has finished, so changing Parallel Workers does not leave
+    its processes running.
+    """
+    pools = worker_pools()
+    with pools["lock"]:
+        if pools["workers"] != workers:
+            old = pools["pool"]
+            pools["workers"], pools["pool"] = workers, make_pool(workers)
+            if old is not None:
+                old.shutdown(wait=False)
+        return pools["pool"]
+
+def reset_worker_pool():
+    """Shut down the shared pool (e.g. after a worker crashed); the next get_worker_pool starts a fresh one"""
+    pools = worker_pools()
+    with pools["lock"]:
+        old = pools["pool"]
+        pools["workers"], pools["pool"] = 0, None
+    if old is not None:
+        old.shutdown(wait=False)
+
+def fill_options(idx, file, exact_default, columns):
+    """Fill strategy controls for a file with `columns`; returns the fill_step arguments"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        strategy = st.selectbox(
+            "Fill Strategy",
+            FILL_STRATEGIES,
+            format_func=str.capitalize,
+            key=f"fillstrategy_{idx}_{file.name}",
+            help="Mean, median or a quantile of each numeric column, or the most frequent value of every column."
+        )
+    with col2:
+        q = st.number_input(
+            "Quantile",
+            min_value=0.0,
+            max_value=1.0,
+            value=0.5,
+            step=0.05,
+            disabled=strategy != "quantile",
+            key=f"fillq_{idx}_{file.name}"
+        )
+    with col3:
+        exact = st.checkbox(
+            "Exact Statistics",
+            value=exact_default,
+            disabled=strategy == "mean",
+            key=f"fillexact_{idx}_{file.name}",
+            help="Compute medians, quantiles and modes exactly instead of estimating them from mergeable sketches."
+        )
+    by = st.multiselect(
+        "Fill Within Groups Of",
+        options=columns,
+        key=f"fillby_{idx}_{file.name}",
+        help="Take the statistics separately for each group of rows with equal values in these columns (e.g. region or product)."
+    )
+    return dict(strategy=strategy, q=q, exact=exact, by=tuple(by) or None)
+
+def text_options(key):
+    """Text normalization operations chosen for a file"""
+    return st.multiselect(
+        "Text Normalization",
+        options=list(TEXT_OPERATIONS),
+        format_func=TEXT_OPERATIONS.get,
+        key=key,
+        help="Normalize every text column with vectorized Arrow kernels; operations run in the order listed."
+    )
+
+def output_options(idx, file):
+    """Output format controls for a file; returns (format, writer options)"""
+    conversion_type = st.radio(
+        "Convert to:",
+        ["CSV", "Excel"] + (COLUMNAR_FORMATS if HAS_PYARROW else []),
+        key=f"conv_{idx}_{file.name}"
+    )
+    if conversion_type == "Excel":
+        excel_split = st.radio(
+            f"Rows Past {EXCEL_MAX_ROWS:,} Go To New",
+            EXCEL_SPLITS,
+            horizontal=True,
+            key=f"split_{idx}_{file.name}",
+            help="Excel worksheets hold at most this many rows. Split workbooks are downloaded as parts "
+                 "and bundled in the ZIP; with openpyxl, only one part is held in memory at a time."
+        )
+        return conversion_type, dict(excel_split=excel_split)
+    if conversion_type not in COLUMNAR_FORMATS:
+        return conversion_type, {}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        codec = st.selectbox(
+            "Compression",
+            PARQUET_CODECS if conversion_type == "Parquet" else IPC_CODECS,
+            key=f"codec_{idx}_{file.name}_{conversion_type}"
+        )
+    with col2:
+        row_group_rows = st.number_input(
+            "Row Group Size (rows)" if conversion_type == "Parquet" else "Record Batch Size (rows)",
+            min_value=1_000,
+            value=ROW_GROUP_ROWS,
+            step=16_384,
+            key=f"rowgroup_{idx}_{file.name}",
+            help="Larger groups compress better; smaller ones let readers skip data and use less memory."
+        )
+    with col3:
+        dictionary = st.checkbox(
+            "Dictionary Encoding",
+            value=True,
+            key=f"dictionary_{idx}_{file.name}",
+            help="Store repeated values once (text columns for Arrow and Feather)."
+        )
+    return conversion_type, dict(codec=codec, row_group_rows=int(row_group_rows), dictionary=dictionary)
+
+def show_messages(messages):
+    """Render (level, text) messages from the cleaning functions"""
+    for level, text in messages:
+        getattr(st, level)(text)
+
+@st.cache_resource
+def clean_data(df, steps):
+    """Cached function running a cleaning plan (a tuple of steps) in one pass; returns (cleaned frame, messages)"""
+    return run_plan(df, list(steps))
+
+def reopen_for_reading(output):
+    """Reopen a written temporary file read-only, rewound: st.download_button accepts BufferedReader, not BufferedRandom"""
+    output.flush()
+    reader = open(os.dup(output.fileno()), "rb")
+    output.close()
+    reader.seek(0)
+    return reader
+
+# Outputs are written chunk by chunk to temporary files, never to an in-memory buffer
+def convert_chunks(chunks, conversion_type, rows=None, **options):
+    """Write chunks to temporary files and return them, rewound for reading, with their MIME type
+
+    Excel outputs split into workbooks give one file per workbook, other
+    outputs one file. `rows`, when known, lets the Excel writer be chosen by
+    the output's size; `options` are output_options' writer options.
+    """
+    outputs = []
+    def new_output():
+        outputs.append(tempfile.TemporaryFile())
+        return outputs[-1]
+    mime = write_chunks(chunks, conversion_type, new_output, st.session_state.excel_writer, rows, **options)
+    return [reopen_for_reading(output) for output in outputs], mime
+
+def convert_file(df, conversion_type, **options):
+    """Convert a whole frame like convert_chunks, encoding EXPORT_CHUNK_ROWS rows at a time"""
+    return convert_chunks(frame_chunks(df), conversion_type, len(df), **options)
 
 # File upload
 uploaded_files = st.file_uploader(
-    "Upload Your files (CSV or Excel): ",
-    type=["csv", "xlsx"],
+    "Upload Your files (CSV, Excel, Parquet or Arrow): " if HAS_PYARROW else "Upload Your files (CSV or Excel): ",
+    type=["csv", "xlsx"]
+    + [suffix.lstrip(".") for suffix in COMPRESSIONS if suffix != ".zst" or HAS_ZSTANDARD]
+    + ([ext.lstrip(".") for ext in COLUMNAR_EXTENSIONS] if HAS_PYARROW else []),
     accept_multiple_files=True
 )
 
-# Dictionary to store converted files for bulk download
-converted_files = {}
+def offer_downloads(idx, file, conversion_type, parts, mime, bulk_zip):
+    """Download buttons for the converted parts of a file, which are also added to the bulk ZIP
+
+    The bulk ZIP is built in a temporary file as each file is converted;
+    entries are compressed in worker threads while later files convert.
+    """
+    for part, data in enumerate(parts, 1):
+        suffix = f"_part{part}" if len(parts) > 1 else ""
+        new_filename = f"{upload_stem(file.name)}_{idx}{suffix}{OUTPUT_EXTENSIONS[conversion_type]}"
+
+        # Download button with success message
+        if st.download_button(
+            label=f"⬇️ Download {new_filename}",
+            data=data,
+            file_name=new_filename,
+            mime=mime,
+            key=f"download_{idx}_{file.name}_{part}"
+        ):
+            st.success(f"Successfully converted {file.name}")
+
+        # Compress into the bulk ZIP once the download button has read the file
+        add_zip_entry(bulk_zip, new_filename, data)
 
 if uploaded_files:
     # Progress bar
     progress_bar = st.progress(0)
     status_text = st.empty()
     
+    read_options = dict(
+        engine=st.session_state.csv_engine,
+        disk_cache_bytes=int(st.session_state.disk_cache_mb) * 1024 * 1024 if st.session_state.disk_cache else 0,
+        excel_engine=st.session_state.excel_engine,
+        dtype_sample_rows=int(st.session_state.dtype_sample_rows) if st.session_state.compact_dtypes else 0
+    )
+    clean_options = dict(
+        auto_remove_duplicates=st.session_state.auto_remove_duplicates,
+        auto_fill_nulls=st.session_state.auto_fill_nulls
+    ) if st.session_state.default_cleaning else None
+    
+    def is_streamed(file):
+        return st.session_state.streaming_mode and upload_extension(file.name) in CSV_EXTENSIONS + (".xlsx",) + COLUMNAR_EXTENSIONS
+    
+    # Large uploads are spooled to disk once per upload and removed with it; copies
+    # left by sessions that ended with uploads in them are swept when a session starts
+    if "spooled_files" not in st.session_state:
+        remove_stale_spools()
+    spooled_files = st.session_state.setdefault("spooled_files", {})
+    uploaded_ids = {file.file_id for file in uploaded_files}
+    for file_id in list(spooled_files):
+        if file_id not in uploaded_ids:
+            remove_spooled(spooled_files.pop(file_id))
+    
+    def source_for(file):
+        """What the readers get for an upload: the upload itself, or its spooled path"""
+        if file.size < int(st.session_state.spool_mb) * 1024 * 1024:
+            return file
+        spooled_files[file.file_id] = spool_upload(file, file.file_id)
+        return spooled_files[file.file_id]
+    
+    # Header columns, read once per upload instead of hashing the upload on every rerun
+    upload_columns = st.session_state.setdefault("upload_columns", {})
+    for file_id in list(upload_columns):
+        if file_id not in uploaded_ids:
+            del upload_columns[file_id]
+    
+    def columns_of(file):
+        if file.file_id not in upload_columns:
+            upload_columns[file.file_id] = file_columns(source_for(file), upload_extension(file.name))
+        return upload_columns[file.file_id]
+    
+    # Cleaning histories per upload, dropped with the upload
+    histories = st.session_state.setdefault("histories", {})
+    for file_id in list(histories):
+        if file_id not in uploaded_ids:
+            del histories[file_id]
+    
+    def projected_columns(idx, file, remove_duplicates):
+        """Columns to parse for a file: its Column Selection, pushed down into the reader"""
+        selected = st.session_state.get(f"cols_{idx}_{file.name}")
+        all_columns = columns_of(file)
+        # Whole-row duplicate detection needs every column
+        if not selected or remove_duplicates or len(selected) >= len(all_columns):
+            return None
+        return tuple(selected)
+    
+    def compares_whole_rows(idx, file):
+        """Whether a file's in-memory cleaning compares whole rows, so it must be read with every column
+
+        That is when its history holds a duplicate or seen-rows step without
+        key columns, or when Remove Duplicates, Remove Previously Seen Rows or
+        Remember These Rows was just clicked with none selected (a clicked
+        button is already True in session state when the script reruns).
+        """
+        history = histories.get(file.file_id)
+        if history is not None and any(
+            kind in (DROP_DUPLICATES, DROP_SEEN) and "subset" not in dict(options) for kind, options in history["steps"]
+        ):
+            return True
+        if st.session_state.get(f"keys_{idx}_{file.name}"):
+            return False
+        return any(st.session_state.get(f"{button}_{idx}_{file.name}") for button in ("dup", "seen", "remember"))
+    
+    file_read_options = {
+        file.file_id: dict(
+            read_options,
+            usecols=projected_columns(
+                idx, file,
+                clean_options is not None and clean_options["auto_remove_duplicates"] or compares_whole_rows(idx, file)
+            )
+        )
+        for idx, file in enumerate(uploaded_files)
+    }
+    
+    def parse_key(file):
+        """Fingerprint of the operations producing a file's frame: the upload, how it is read and auto-cleaned"""
+        return (
+            file.file_id,
+            tuple(sorted(file_read_options[file.file_id].items())),
+            tuple(sorted((clean_options or {}).items()))
+        )
+    
+    # Parsed and auto-cleaned frames with their messages, kept across reruns for the
+    # files still uploaded and reused until their parse_key changes
+    parsed_files = st.session_state.setdefault("parsed_files", {})
+    current_keys = {parse_key(file) for file in uploaded_files}
+    for key in list(parsed_files):
+        if key not in current_keys:
+            del parsed_files[key]
+    
+    # Parse and clean new uploads in parallel, updating progress as each one finishes
+    pending = [file for file in uploaded_files if not is_streamed(file) and parse_key(file) not in parsed_files]
+    workers = int(st.session_state.parallel_workers)
+    if workers > 1 and len(pending) > 1:
+        pool = get_worker_pool(workers)
+        futures = {}
+        for file in pending:
+            # Spooled uploads are passed by path instead of pickling their bytes
+            source = source_for(file)
+            future = pool.submit(
+                process_upload,
+                file.name,
+                source if isinstance(source, str) else file.getvalue(),
+                upload_extension(file.name),
+                file_read_options[file.file_id],
+                clean_options
+            )
+            futures[future] = file
+        for done, future in enumerate(as_completed(futures), 1):
+            file = futures[future]
+            try:
+                parsed_files[parse_key(file)] = future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool on the next run
+                reset_worker_pool()
+                parsed_files[parse_key(file)] = (None, [("error", f"Error reading file {file.name}: worker process crashed")])
+            except Exception as e:
+                parsed_files[parse_key(file)] = (None, [("error", f"Error reading file {file.name}: {e}")])
+            progress_bar.progress(done / len(futures))
+            status_text.text(f"Processed {done} of {len(futures)} files ({file.name})")
+    
     # Process each file
-    for idx, file in enumerate(uploaded_files):
-        # Update progress
-        progress = (idx + 1) / len(uploaded_files)
-        progress_bar.progress(progress)
-        status_text.text(f"Processing file {idx + 1} of {len(uploaded_files)}")
+    bulk_zip = new_bulk_zip(int(st.session_state.parallel_workers))
+    try:
+        for idx, file in enumerate(uploaded_files):
+            file_ext = upload_extension(file.name)
+            source = source_for(file)
+            parsed = parsed_files.get(parse_key(file))
         
-        file_ext = os.path.splitext(file.name)[-1].lower()
+            # Update progress for files processed in this loop
+            if parsed is None:
+                progress = (idx + 1) / len(uploaded_files)
+                progress_bar.progress(progress)
+                status_text.text(f"Processing file {idx + 1} of {len(uploaded_files)}")
         
-        # Create expander for each file
-        with st.expander(f"📄 {file.name}", expanded=True):
-            # Read file
-            df = read_file(file, file_ext)
-            if df is None:
-                continue
-            
-            # Apply auto-cleaning if enabled
-            if st.session_state.default_cleaning:
-                df = clean_data(df, st.session_state.auto_remove_duplicates, st.session_state.auto_fill_nulls)
-            
-            # File info
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("File Size", f"{file.size / (1024 * 1024):.2f} MB")
-            with col2:
-                st.metric("Rows", f"{df.shape[0]:,}")
-            with col3:
-                st.metric("Columns", f"{df.shape[1]:,}")
-            
-            # Data preview with optimized display
-            st.subheader("📊 Data Preview")
-            st.dataframe(df.head(), use_container_width=True)
-
-            # Data Cleaning Options
-            st.subheader("🧹 Data Cleaning")
-            if not st.session_state.default_cleaning:
-                cleaning_enabled = st.checkbox(f"Clean Data for {file.name}", key=f"clean_{idx}_{file.name}")
-            else:
-                cleaning_enabled = True
+            # Create expander for each file
+            with st.expander(f"📄 {file.name}", expanded=True):
+                # Streaming mode: never materialize the whole CSV
+                if is_streamed(file):
+                    chunk_size = int(st.session_state.chunk_size)
+                    try:
+                        all_columns = columns_of(file)
+                        preview = next(read_file_chunks(source, file_ext, min(chunk_size, 1_000), st.session_state.csv_engine), pd.DataFrame())
+                    except Exception as e:
+                        st.error(f"Error reading file {file.name}: {e}")
+                        continue
+
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("File Size", f"{file.size / (1024 * 1024):.2f} MB")
+                    with col2:
+                        st.metric("Chunk Size", f"{chunk_size:,} rows")
+                    with col3:
+                        st.metric("Columns", f"{len(all_columns):,}")
+
+                    st.subheader("📊 Data Preview")
+                    st.dataframe(preview.head(), use_container_width=True)
+
+                    st.subheader("🧹 Data Cleaning")
+                    remove_duplicates = st.session_state.default_cleaning and st.session_state.auto_remove_duplicates
+                    fill_nulls = st.session_state.default_cleaning and st.session_state.auto_fill_nulls
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        remove_duplicates = st.checkbox("Remove Duplicates", value=remove_duplicates, key=f"sdup_{idx}_{file.name}")
+                    with col2:
+                        fill_nulls = st.checkbox("Fill Missing Values", value=fill_nulls, key=f"sfill_{idx}_{file.name}")
+                    with col3:
+                        drop_nulls = st.checkbox("Remove Null Rows", key=f"snull_{idx}_{file.name}")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        key_columns = st.multiselect(
+                            "Duplicate Key Columns",
+                            options=all_columns,
+                            key=f"skeys_{idx}_{file.name}",
+                            help="Rows with equal values in these columns count as duplicates. Empty compares whole rows."
+                        )
+                    with col2:
+                        drop_seen = st.checkbox("Remove Previously Seen Rows", key=f"sseen_{idx}_{file.name}")
+                    with col3:
+                        remember = st.checkbox("Remember Rows After Conversion", key=f"sremember_{idx}_{file.name}")
+                    fill = fill_options(idx, file, exact_default=False, columns=all_columns)
+                    text_ops = text_options(f"stext_{idx}_{file.name}")
+
+                    st.subheader("📑 Column Selection")
+                    selected_columns = st.multiselect(
+                        "Choose columns to include",
+                        options=all_columns,
+                        default=all_columns,
+                        key=f"cols_{idx}_{file.name}"
+                    )
+                    # Grouped fills need their key columns whether or not they are included
+                    usecols = projected_columns(idx, file, remove_duplicates or drop_seen or remember or fill_nulls and fill["by"] is not None)
+
+                    st.subheader("🔄 Conversion Options")
+                    conversion_type, output = output_options(idx, file)
+
+                    if st.button(f"Convert {file.name}", key=f"convert_{idx}_{file.name}"):
+                        messages = []
+                        chunks = clean_chunks(
+                            lambda: read_file_chunks(source, file_ext, chunk_size, st.session_state.csv_engine, usecols),
+                            auto_remove_duplicates=remove_duplicates,
+                            auto_fill_nulls=fill_nulls,
+                            drop_nulls=drop_nulls,
+                            messages=messages,
+                            key_columns=key_columns,
+                            drop_seen=drop_seen,
+                            fill=fill,
+                            text_ops=text_ops
+                        )
+                        remembered = {}
+                        if remember:
+                            chunks = remembering(chunks, tuple(key_columns) or None, remembered)
+                        if selected_columns:
+                            chunks = (chunk[selected_columns] for chunk in chunks)
+                        try:
+                            parts, mime = convert_chunks(chunks, conversion_type, **output)
+                        except ValueError as e:
+                            st.error(f"Error converting {file.name}: {e}")
+                            continue
+                        show_messages(messages)
+                        if remember:
+                            st.success(f"Remembered {remembered['remembered']} new rows for later uploads.")
+                        offer_downloads(idx, file, conversion_type, parts, mime, bulk_zip)
+                    continue
+
+                # (step, bytes allocated) for Show Memory Use
+                allocations = [] if st.session_state.show_memory else None
+
+                # Read file and apply auto-cleaning once; later reruns reuse the stored result
+                if parsed is None:
+                    try:
+                        with track_allocations(allocations, "Read"):
+                            df = read_file(source, file_ext, **file_read_options[file.file_id])
+                        parsed = (df, [])
+                    except Exception as e:
+                        parsed = (None, [("error", f"Error reading file {file.name}: {e}")])
+                    if parsed[0] is not None and clean_options is not None:
+                        # A failed cleaning step keeps the file, uncleaned
+                        try:
+                            with track_allocations(allocations, "Auto-cleaning"):
+                                parsed = clean_data(df, tuple(cleaning_steps(**clean_options)))
+                        except Exception as e:
+                            parsed = (df, [("error", f"Error cleaning {file.name}: {e}")])
+                    parsed_files[parse_key(file)] = parsed
+                df, messages = parsed
+                show_messages(messages)
+                if df is None:
+                    continue
             
-            if cleaning_enabled:
+                # File info
                 col1, col2, col3 = st.columns(3)
-                
                 with col1:
-                    if st.button("Remove Duplicates", key=f"dup_{idx}_{file.name}"):
-                        df = clean_data(df, auto_remove_duplicates=True, auto_fill_nulls=False)
-                
+                    st.metric("File Size", f"{file.size / (1024 * 1024):.2f} MB")
                 with col2:
-                    if st.button("Fill Missing Values", key=f"fill_{idx}_{file.name}"):
-                        df = clean_data(df, auto_remove_duplicates=False, auto_fill_nulls=True)
-                
+                    st.metric("Rows", f"{df.shape[0]:,}")
                 with col3:
-                    if st.button("Remove Null Rows", key=f"null_{idx}_{file.name}"):
-                        before = df.shape[0]
-                        df = df.dropna()
-                        after = df.shape[0]
-                        st.success(f"Removed {before - after} rows with null values.")
+                    st.metric("Columns", f"{df.shape[1]:,}")
             
-            # Column Selection
-            st.subheader("📑 Column Selection")
-            selected_columns = st.multiselect(
-                "Choose columns to include",
-                options=df.columns.tolist(),
-                default=list(df.columns),
-                key=f"cols_{idx}_{file.name}"
-            )
-            if selected_columns:
-                df = df[selected_columns]
-
-            # Data Visualization with optimized display
-            st.subheader("📈 Data Visualization")
-            if st.checkbox("Show visualization", key=f"viz_{idx}_{file.name}"):
-                numeric_cols = df.select_dtypes(include="number").columns
-                if len(numeric_cols) > 0:
-                    if st.session_state.chart_type == "Bar Chart":
-                        st.bar_chart(df[numeric_cols].head())
-                    elif st.session_state.chart_type == "Line Chart":
-                        st.line_chart(df[numeric_cols].head())
-                    else:
-                        if len(numeric_cols) >= 2:
-                            st.scatter_chart(df[numeric_cols].head())
-                        else:
-                            st.warning("Need at least 2 numeric columns for scatter plot")
+                # Data preview with optimized display
+                st.subheader("📊 Data Preview")
+                st.dataframe(df.head(), use_container_width=True)
+
+                # Data Cleaning Options
+                st.subheader("🧹 Data Cleaning")
+                if not st.session_state.default_cleaning:
+                    cleaning_enabled = st.checkbox(f"Clean Data for {file.name}", key=f"clean_{idx}_{file.name}")
                 else:
-                    st.warning("No numeric columns available for visualization.")
-
-            # Conversion Options
-            st.subheader("🔄 Conversion Options")
-            conversion_type = st.radio(
-                "Convert to:",
-                ["CSV", "Excel"],
-                key=f"conv_{idx}_{file.name}"
-            )
+                    cleaning_enabled = True
             
-            if st.button(f"Convert {file.name}", key=f"convert_{idx}_{file.name}"):
-                data, mime = convert_file(df, conversion_type)
-                new_filename = f"{os.path.splitext(file.name)[0]}_{idx}.{'csv' if conversion_type == 'CSV' else 'xlsx'}"
+                if cleaning_enabled:
+                    # Buttons record steps in a per-file undo/redo history of compact deltas
+                    history = histories.setdefault(file.file_id, new_history())
+                    step = None
+                    key_columns = st.multiselect(
+                        "Duplicate Key Columns",
+                        options=df.columns.tolist(),
+                        key=f"keys_{idx}_{file.name}",
+                        help="Rows with equal values in these columns count as duplicates. Empty compares whole rows."
+                    )
+                    subset = tuple(key_columns) or None
+                    fill = fill_options(idx, file, exact_default=True, columns=df.columns.tolist())
+                    text_ops = text_options(f"text_{idx}_{file.name}")
+                    col1, col2, col3 = st.columns(3)
                 
-                # Download button with success message
-                if st.download_button(
-                    label=f"⬇️ Download {new_filename}",
-                    data=data,
-                    file_name=new_filename,
-                    mime=mime,
-                    key=f"download_{idx}_{file.name}"
-                ):
-                    st.success(f"Successfully converted {file.name}")
+                    with col1:
+                        if st.button("Remove Duplicates", key=f"dup_{idx}_{file.name}"):
+                            step = make_step(DROP_DUPLICATES, subset=subset)
                 
-                # Save for bulk download
-                converted_files[new_filename] = data
+                    with col2:
+                        if st.button("Fill Missing Values", key=f"fill_{idx}_{file.name}"):
+                            step = fill_step(**fill)
+                
+                    with col3:
+                        if st.button("Remove Null Rows", key=f"null_{idx}_{file.name}"):
+                            step = make_step(DROP_NULLS)
+                
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        if st.button("Remove Previously Seen Rows", key=f"seen_{idx}_{file.name}"):
+                            step = make_step(DROP_SEEN, subset=subset)
+                    with col2:
+                        remember = st.button("Remember These Rows", key=f"remember_{idx}_{file.name}")
+                    with col3:
+                        if st.button("Forget Remembered Rows", key=f"forget_{idx}_{file.name}"):
+                            forget_rows(subset)
+                            st.success("Forgot the remembered rows for these key columns.")
+                
+                    if st.button("Normalize Text", key=f"normalize_{idx}_{file.name}", disabled=not text_ops):
+                        step = text_step(text_ops)
+                
+                    with track_allocations(allocations, "Cleaning"):
+                        if step is not None:
+                            # A step that fails is not recorded
+                            try:
+                                record_step(history, df, step)
+                            except Exception as e:
+                                st.error(f"Error cleaning {file.name}: {step_label(step)}: {e}")
+                        df = history_frame(history, df)
+                    show_messages(applied_messages(history))
+                
+                    if history["steps"]:
+                        steps = applied_steps(history)
+                        st.caption(
+                            "Cleaning steps: " + (" → ".join(map(step_label, steps)) or "none")
+                            + f" ({len(history['steps']) - len(steps)} undone; history uses {history_nbytes(history) / 1024:,.1f} KB)"
+                        )
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            if st.button("Undo", key=f"undo_{idx}_{file.name}", disabled=not steps):
+                                undo(history)
+                                st.rerun()
+                        with col2:
+                            if st.button("Redo", key=f"redo_{idx}_{file.name}", disabled=len(steps) == len(history["steps"])):
+                                redo(history)
+                                st.rerun()
+                        with col3:
+                            if st.button("Reset Cleaning", key=f"reset_{idx}_{file.name}"):
+                                reset_history(history)
+                                st.rerun()
+                
+                    # Remembers the rows as cleaned so far, for Remove Previously Seen Rows on later uploads
+                    if remember:
+                        st.success(f"Remembered {remember_rows([df], subset)} new rows for later uploads.")
+            
+                # Column Selection
+                st.subheader("📑 Column Selection")
+                # Options come from the header: unselected columns are not parsed at all
+                all_columns = columns_of(file) or df.columns.tolist()
+                selected_columns = st.multiselect(
+                    "Choose columns to include",
+                    options=all_columns,
+                    default=all_columns,
+                    key=f"cols_{idx}_{file.name}"
+                )
+                st.caption(
+                    "Unselected columns are not read from the file, so the cleaning buttons only see the included columns; "
+                    "duplicate and seen-row checks without key columns read every column."
+                )
+                selected_columns = [col for col in selected_columns if col in df.columns]
+                if selected_columns:
+                    with track_allocations(allocations, "Column selection"):
+                        df = df[selected_columns]
+                if allocations is not None:
+                    st.caption("Memory allocated: " + ", ".join(
+                        f"{label} {size / (1024 * 1024):,.1f} MB" for label, size in allocations
+                    ))
+
+                # Data Visualization with optimized display
+                st.subheader("📈 Data Visualization")
+                if st.checkbox("Show visualization", key=f"viz_{idx}_{file.name}"):
+                    numeric_cols = df.select_dtypes(include="number").columns
+                    if len(numeric_cols) > 0:
+                        if st.session_state.chart_type == "Bar Chart":
+                            st.bar_chart(df[numeric_cols].head())
+                        elif st.session_state.chart_type == "Line Chart":
+                            st.line_chart(df[numeric_cols].head())
+                        else:
+                            if len(numeric_cols) >= 2:
+                                st.scatter_chart(df[numeric_cols].head())
+                            else:
+                                st.warning("Need at least 2 numeric columns for scatter plot")
+                    else:
+                        st.warning("No numeric columns available for visualization.")
+
+                # Conversion Options
+                st.subheader("🔄 Conversion Options")
+                conversion_type, output = output_options(idx, file)
+            
+                if st.button(f"Convert {file.name}", key=f"convert_{idx}_{file.name}"):
+                    try:
+                        parts, mime = convert_file(df, conversion_type, **output)
+                    except ValueError as e:
+                        st.error(f"Error converting {file.name}: {e}")
+                        continue
+                    offer_downloads(idx, file, conversion_type, parts, mime, bulk_zip)
+    finally:
+        # Also on st.rerun(), which unwinds the script with an exception
+        zip_file, zip_files = close_bulk_zip(bulk_zip)
 
     # Bulk download section
-    if converted_files:
+    if zip_files:
         st.markdown("---")
         st.subheader("📦 Bulk Download")
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for fname, data in converted_files.items():
-                zf.writestr(fname, data)
-        zip_buffer.seek(0)
         
         if st.download_button(
             "⬇️ Download All Converted Files as ZIP",
-            data=zip_buffer.getvalue(),
+            data=reopen_for_reading(zip_file),
             file_name=f"converted_files_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
             mime="application/zip",
             key="bulk_download"
         ):
-            st.success(f"Successfully downloaded {len(converted_files)} files")
+            st.success(f"Successfully downloaded {zip_files} files")
         
-        st.info(f"Total files in ZIP: {len(converted_files)}")
+        st.info(f"Total files in ZIP: {zip_files}")
     
     # Clear progress bar
     progress_bar.empty()
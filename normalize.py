@@ -0,0 +1,135 @@
+"""Vectorized text normalization for Data Sweeper's string columns
+
+Each operation runs as a PyArrow compute kernel over a whole column (pandas 3
+already stores strings in Arrow arrays, so these are converted without
+copying); without pyarrow, pandas' .str methods are used. Categorical columns
+only normalize their categories, so each distinct value is normalized once.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Operations in the order they are applied, whatever order they were chosen in:
+# normalizing first turns compatibility spaces into plain ones for the whitespace
+# operations, and non-printables go before whitespace is collapsed and trimmed
+TEXT_OPERATIONS = {
+    "unicode": "Unicode Normalize (NFKC)",
+    "printable": "Strip Non-printables",
+    "collapse": "Collapse Whitespace",
+    "trim": "Trim Whitespace",
+    "casefold": "Case-fold",
+}
+UNICODE_FORM = "NFKC"
+
+# Control, format and private-use characters other than whitespace (RE2 syntax);
+# the pandas fallback lists the common ones
+NON_PRINTABLE_RE2 = r"[^\P{C}\t\n\v\f\r]"
+NON_PRINTABLE_RE = "[\x00-\x08\x0e-\x1f\x7f-\x9f\u00ad\u200b-\u200f\u202a-\u202e\u2060-\u2064\ufeff]"
+# Runs of whitespace; RE2's \s is ASCII only
+WHITESPACE_RE2 = r"[\s\p{Z}]+"
+
+def text_operations(ops):
+    """Chosen operations as a tuple in application order; unknown names raise ValueError"""
+    unknown = set(ops) - set(TEXT_OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown text operation: {', '.join(sorted(unknown))}")
+    return tuple(op for op in TEXT_OPERATIONS if op in ops)
+
+def normalize_arrow(array, ops):
+    """Apply operations to an Arrow string array with compute kernels"""
+    for op in ops:
+        if op == "unicode":
+            array = pc.utf8_normalize(array, UNICODE_FORM)
+        elif op == "printable":
+            array = pc.replace_substring_regex(array, NON_PRINTABLE_RE2, "")
+        elif op == "collapse":
+            array = pc.replace_substring_regex(array, WHITESPACE_RE2, " ")
+        elif op == "trim":
+            array = pc.utf8_trim_whitespace(array)
+        else:
+            array = pc.utf8_lower(array)
+    return array
+
+def normalize_strings(series, ops):
+    """Apply operations to a series of strings with pandas' .str methods"""
+    strings = series.str
+    for op in ops:
+        if op == "unicode":
+            series = strings.normalize(UNICODE_FORM)
+        elif op == "printable":
+            series = strings.replace(NON_PRINTABLE_RE, "", regex=True)
+        elif op == "collapse":
+            series = strings.replace(r"\s+", " ", regex=True)
+        elif op == "trim":
+            series = strings.strip()
+        else:
+            series = strings.lower()
+        strings = series.str
+    return series
+
+def normalize_values(series, ops):
+    """(normalized series, number of values changed) for a series of strings, keeping its dtype"""
+    if HAS_PYARROW:
+        array = pa.array(series, from_pandas=True)
+        normalized = normalize_arrow(array, ops)
+        changed = pc.sum(pc.not_equal(array, normalized)).as_py() or 0
+        # pd.array would turn object columns into str; keep them object, with None for nulls
+        if series.dtype == object:
+            values = normalized.to_numpy(zero_copy_only=False)
+        else:
+            values = pd.array(normalized, dtype=series.dtype)
+        return pd.Series(values, index=series.index, name=series.name, dtype=series.dtype), changed
+    normalized = normalize_strings(series, ops)
+    changed = int((series.notna() & (series != normalized)).sum())
+    return normalized.astype(series.dtype), changed
+
+def is_text(series):
+    """Whether a column holds strings: string dtypes, and object columns of strings only"""
+    if pd.api.types.is_string_dtype(series.dtype) and series.dtype != object:
+        return True
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "string"
+
+def normalize_column(series, ops):
+    """(normalized column, number of values changed), or (series, 0) if it does not hold text
+
+    Categories that become equal are merged.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.to_series()
+        if not is_text(categories):
+            return series, 0
+        normalized, _ = normalize_values(categories, ops)
+        if normalized.equals(categories):
+            return series, 0
+        codes = series.cat.codes.to_numpy()
+        new_codes, new_categories = pd.factorize(normalized)
+        recoded = np.where(codes >= 0, new_codes[codes], -1)
+        differs = normalized.to_numpy() != categories.to_numpy()
+        changed = int(differs[codes[codes >= 0]].sum())
+        result = pd.Categorical.from_codes(recoded, categories=new_categories)
+        return pd.Series(result, index=series.index, name=series.name), changed
+    if not is_text(series):
+        return series, 0
+    return normalize_values(series, ops)
+
+def normalize_text(chunk, ops, columns=None):
+    """(chunk with its text columns, or `columns`, normalized, number of values changed)
+
+    Columns that are not text, or that no operation changes, stay shared with chunk.
+    """
+    ops = text_operations(ops)
+    normalized, changed = chunk, 0
+    for col in chunk.columns if columns is None else [col for col in columns if col in chunk.columns]:
+        series, count = normalize_column(chunk[col], ops)
+        if count:
+            if normalized is chunk:
+                normalized = chunk.copy(deep=False)
+            normalized[col] = series
+            changed += count
+    return normalized, changed
@@ -0,0 +1,34 @@
+"""Parallel parsing and cleaning of uploads in a worker process pool"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from readers import load_frame
+from cleaning import clean_frame
+
+class UploadBuffer(BytesIO):
+    """In-memory upload with the `name` and `size` attributes of Streamlit's UploadedFile"""
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+def process_upload(name, source, ext, read_options, clean_options=None):
+    """Worker: parse and optionally clean one upload; returns (frame, messages)
+
+    `source` is the upload's bytes, or the path of its spooled copy so that
+    large files are not pickled across to the worker.
+    """
+    file = source if isinstance(source, str) else UploadBuffer(source, name)
+    df = load_frame(file, ext, **read_options)
+    if clean_options is None:
+        return df, []
+    try:
+        return clean_frame(df, **clean_options)
+    except Exception as e:
+        # Read errors propagate to the caller; a failed cleaning step keeps the file, uncleaned
+        return df, [("error", f"Error cleaning {name}: {e}")]
+
+def make_pool(workers):
+    """Process pool started with "spawn": forking the multi-threaded Streamlit server is unsafe"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
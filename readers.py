@@ -0,0 +1,604 @@
+"""File readers for Data Sweeper: CSV parser engines, Excel engines and the parse cache
+
+Readers take either an upload (a file-like object with `name` and `size`) or
+the path of an upload spooled to disk, which the CSV parsers memory-map.
+Compressed CSVs are decompressed as a stream while they are parsed.
+"""
+import os
+import bz2
+import gzip
+import shutil
+import zipfile
+import tempfile
+import time
+import hashlib
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (enables the multi-threaded PyArrow CSV engine)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    import python_calamine  # noqa: F401  (enables pandas' Rust-backed "calamine" Excel engine)
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+try:
+    import zstandard  # noqa: F401  (enables .zst uploads)
+    HAS_ZSTANDARD = True
+except ImportError:
+    HAS_ZSTANDARD = False
+
+# Compressed CSV uploads, by their last suffix ("data.csv.gz", or a bare "export.zip" of CSVs)
+COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".zst": "zstd", ".zip": "zip"}
+CSV_EXTENSIONS = (".csv",) + tuple(".csv" + suffix for suffix in COMPRESSIONS)
+
+# Columnar input formats (read with pyarrow)
+COLUMNAR_EXTENSIONS = (".parquet", ".feather", ".arrow")
+
+# Uploads above the spool threshold are copied here and parsed from memory-mapped files
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), "data_sweeper_spool")
+# Spooled copies unused for this long (seconds) are left over from ended sessions
+SPOOL_MAX_AGE = 24 * 60 * 60
+
+# CSV parser engines: files at least this large are parsed with PyArrow when available
+CSV_ENGINES = ["Auto", "PyArrow", "C", "Python"]
+PYARROW_MIN_BYTES = 8 * 1024 * 1024
+
+# Excel engines: without calamine, files at least this large use openpyxl's read-only row streaming
+EXCEL_ENGINES = ["Auto", "Calamine", "openpyxl (read-only)", "openpyxl"]
+EXCEL_STREAMING_MIN_BYTES = 5 * 1024 * 1024
+
+# Dtype inference: rows sampled before the full read, and the distinct/non-null
+# ratio at or below which a text column is stored as a categorical
+DTYPE_SAMPLE_ROWS = 10_000
+CATEGORY_MAX_RATIO = 0.5
+
+# On-disk parse cache: Parquet files named by the SHA-256 of the upload and read options
+PARSE_CACHE_DIR = os.environ.get(
+    "DATA_SWEEPER_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "data_sweeper_cache")
+)
+# Part of every parse cache key: bump it when the readers change the frames
+# they produce, so frames parsed by an older version are not reused
+PARSE_CACHE_VERSION = 1
+
+def rewind(file):
+    """Seek an upload back to its start; paths need nothing"""
+    if not isinstance(file, str):
+        file.seek(0)
+
+def upload_size(file):
+    """Size in bytes of an upload or spooled path"""
+    if isinstance(file, str):
+        return os.path.getsize(file)
+    return file.size
+
+def spool_upload(file, key):
+    """Copy an upload to SPOOL_DIR/<key>/<name> in 1 MB blocks and return the path
+
+    The copy keeps the upload's file name so error messages stay readable;
+    an existing copy of the same size is reused (and marked as recently used,
+    see remove_stale_spools).
+    """
+    directory = os.path.join(SPOOL_DIR, key)
+    path = os.path.join(directory, os.path.basename(file.name))
+    if os.path.exists(path) and os.path.getsize(path) == file.size:
+        os.utime(directory)
+        return path
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    file.seek(0)
+    with open(tmp_path, "wb") as out:
+        shutil.copyfileobj(file, out, 1024 * 1024)
+    file.seek(0)
+    os.replace(tmp_path, path)
+    return path
+
+def remove_spooled(path):
+    """Delete a spooled copy and its directory"""
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+def remove_stale_spools(max_age=SPOOL_MAX_AGE):
+    """Delete spooled copies not used for `max_age` seconds
+
+    Copies are removed with their upload, but not when a session ends with
+    uploads still in it or the server stops, so these are swept by age.
+    """
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(SPOOL_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+def upload_extension(name):
+    """Reader extension for an upload name: ".csv", ".xlsx", ... or ".csv.gz" etc. for compressed CSVs"""
+    ext = os.path.splitext(name)[-1].lower()
+    return ".csv" + ext if ext in COMPRESSIONS else ext
+
+def upload_stem(name):
+    """Upload name without its format and compression extensions ("data.csv.gz" -> "data")"""
+    root, ext = os.path.splitext(name)
+    if ext.lower() in COMPRESSIONS and os.path.splitext(root)[-1].lower() == ".csv":
+        root = os.path.splitext(root)[0]
+    return root
+
+def csv_compression(ext):
+    """Compression of a CSV reader extension (".csv.gz" -> "gzip"); None for plain CSV"""
+    return COMPRESSIONS.get(os.path.splitext(ext)[-1])
+
+def open_compressed(file, compression):
+    """Decompressing reader over an upload or spooled path; closing it leaves an upload open"""
+    if compression == "gzip":
+        return gzip.open(file, "rb")
+    if compression == "bz2":
+        return bz2.open(file, "rb")
+    if compression == "zstd":
+        if not HAS_ZSTANDARD:
+            raise ValueError("Reading .zst files requires the zstandard package")
+        import zstandard
+
+        handle = open(file, "rb") if isinstance(file, str) else file
+        return zstandard.ZstdDecompressor().stream_reader(handle, closefd=handle is not file)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+def zip_csv_members(archive):
+    """CSV members of a zip archive in archive order; a single non-CSV file is read as CSV too"""
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+    ]
+    csv_members = [info for info in members if info.filename.lower().endswith(".csv")]
+    if csv_members:
+        return csv_members
+    if len(members) == 1:
+        return members
+    raise ValueError("The zip archive contains no CSV files")
+
+def csv_streams(file, compression=None):
+    """Yield readable streams over the CSV data of an upload, decompressing as they are read
+
+    A plain upload is yielded as is. Compressed uploads are wrapped in a
+    decompressing reader, so only the parser's read buffer is ever held
+    decompressed; zip archives yield each CSV member in turn.
+    """
+    rewind(file)
+    try:
+        if compression is None:
+            yield file
+        elif compression == "zip":
+            with zipfile.ZipFile(file) as archive:
+                for info in zip_csv_members(archive):
+                    with archive.open(info) as stream:
+                        yield stream
+        else:
+            with open_compressed(file, compression) as stream:
+                yield stream
+    finally:
+        rewind(file)
+
+def read_csv_members(file, compression=None, **kwargs):
+    """pd.read_csv over every CSV stream of an upload; zip members are concatenated"""
+    frames = [pd.read_csv(stream, **kwargs) for stream in csv_streams(file, compression)]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def read_csv_head(file, compression=None, **kwargs):
+    """pd.read_csv over the first CSV stream of an upload (header or sample reads)"""
+    streams = csv_streams(file, compression)
+    try:
+        return pd.read_csv(next(streams), **kwargs)
+    finally:
+        streams.close()
+
+def choose_csv_engine(size, requested="Auto", chunked=False):
+    """Resolve the engine setting to a pandas read_csv engine name"""
+    if requested == "Python":
+        return "python"
+    # The PyArrow engine cannot read in chunks
+    pyarrow_ok = HAS_PYARROW and not chunked
+    if requested == "PyArrow":
+        return "pyarrow" if pyarrow_ok else "c"
+    if requested == "C":
+        return "c"
+    return "pyarrow" if pyarrow_ok and size >= PYARROW_MIN_BYTES else "c"
+
+def read_csv_with_engine(file, engine, compression=None, **kwargs):
+    """pd.read_csv with engine-specific options; PyArrow failures retry with the C engine"""
+    # Compressed paths are decompressed through a stream, which cannot be memory-mapped
+    memory_map = isinstance(file, str) and compression is None
+    if engine == "c":
+        kwargs.setdefault("low_memory", False)
+    if engine != "pyarrow" and memory_map:
+        kwargs.setdefault("memory_map", True)
+    try:
+        return read_csv_members(file, compression, engine=engine, **kwargs)
+    except Exception:
+        if engine != "pyarrow":
+            raise
+        # The PyArrow parser is stricter (e.g. ragged rows); the C parser is the reference
+        return read_csv_members(file, compression, engine="c", low_memory=False, memory_map=memory_map, **kwargs)
+
+def upload_digest(file):
+    """SHA-256 hex digest of an upload's bytes, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    handle = open(file, "rb") if isinstance(file, str) else file
+    try:
+        handle.seek(0)
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+        handle.seek(0)
+    finally:
+        if handle is not file:
+            handle.close()
+    return digest.hexdigest()
+
+def parse_cache_path(digest, **options):
+    """Cache file for an upload digest plus the options that affect the parsed frame"""
+    key = hashlib.sha256(repr((PARSE_CACHE_VERSION, digest, sorted(options.items()))).encode()).hexdigest()
+    return os.path.join(PARSE_CACHE_DIR, f"{key}.parquet")
+
+def load_cached_frame(path):
+    """Read a cached frame, marking it as recently used; None on a miss"""
+    try:
+        df = pd.read_parquet(path)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+def store_cached_frame(path, df, max_bytes):
+    """Write a frame to the cache and evict least recently used entries above max_bytes"""
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        # Frames Parquet cannot represent (mixed-type columns, non-string names) are not cached
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_parse_cache(max_bytes)
+
+def evict_parse_cache(max_bytes):
+    """Delete least recently used cache entries until the cache fits in max_bytes"""
+    if not os.path.isdir(PARSE_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(PARSE_CACHE_DIR):
+        if entry.name.endswith(".parquet"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def read_csv_chunks(file, chunksize, engine="Auto", usecols=None, compression=None):
+    """Yield a CSV upload as DataFrames of at most `chunksize` rows, decompressing as it goes"""
+    engine = choose_csv_engine(upload_size(file), engine, chunked=True)
+    kwargs = {"low_memory": False} if engine == "c" else {}
+    if isinstance(file, str) and compression is None:
+        kwargs["memory_map"] = True
+    if usecols:
+        kwargs["usecols"] = list(usecols)
+    for stream in csv_streams(file, compression):
+        with pd.read_csv(stream, chunksize=chunksize, engine=engine, **kwargs) as reader:
+            yield from reader
+
+def choose_excel_engine(size, requested="Auto"):
+    """Resolve the Excel engine setting to calamine, openpyxl-readonly or openpyxl"""
+    if requested == "openpyxl":
+        return "openpyxl"
+    if requested == "Calamine" or (requested == "Auto" and HAS_CALAMINE):
+        if HAS_CALAMINE:
+            return "calamine"
+    if requested == "Auto" and size < EXCEL_STREAMING_MIN_BYTES:
+        return "openpyxl"
+    return "openpyxl-readonly"
+
+def excel_column_names(header):
+    """Column names for a worksheet header row, named like pd.read_excel names blank headers"""
+    return [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+
+def read_excel_chunks(file, chunksize, usecols=None):
+    """Yield the first sheet of an .xlsx upload as DataFrames, streaming rows with openpyxl read-only mode
+
+    Only `chunksize` rows are held as Python objects at a time; the worksheet
+    XML is parsed incrementally instead of being loaded as a full DOM. Cells
+    outside `usecols` are dropped as each row is read.
+    """
+    from openpyxl import load_workbook
+
+    rewind(file)
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = excel_column_names(header)
+        width = len(columns)
+        positions = None
+        if usecols:
+            wanted = set(usecols)
+            positions = [i for i, name in enumerate(columns) if name in wanted]
+            columns = [columns[i] for i in positions]
+
+        block, blank = [], []
+        for row in rows:
+            if all(value is None for value in row):
+                # Like pd.read_excel: keep blank rows inside the data, drop trailing ones
+                blank.append(row)
+                continue
+            for values in blank + [row]:
+                values = tuple(values[:width]) + (None,) * (width - len(values))
+                block.append(values if positions is None else tuple(values[i] for i in positions))
+            blank.clear()
+            if len(block) >= chunksize:
+                yield pd.DataFrame.from_records(block, columns=columns).infer_objects()
+                block = []
+        if block:
+            yield pd.DataFrame.from_records(block, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+def read_excel_with_engine(file, engine, usecols=None):
+    """Read the first sheet of an .xlsx upload with a resolved engine name"""
+    rewind(file)
+    if engine == "openpyxl-readonly":
+        chunks = list(read_excel_chunks(file, 100_000, usecols))
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    if not usecols:
+        return pd.read_excel(file, engine=engine)
+    # A list would read numeric headers (2022, 2023...) as column positions; match names instead
+    wanted = set(usecols)
+    return pd.read_excel(file, engine=engine, usecols=lambda name: name in wanted)
+
+def arrow_source(file):
+    """pyarrow input for an upload: a memory map of a spooled path, or a zero-copy view of the upload buffer"""
+    import pyarrow as pa
+
+    if isinstance(file, str):
+        return pa.memory_map(file)
+    return pa.BufferReader(pa.py_buffer(file.getbuffer()))
+
+def read_columnar_table(file, ext, usecols=None):
+    """Load a Parquet, Feather or Arrow IPC upload as a pyarrow Table, reading only `usecols`
+
+    Uncompressed Feather/IPC columns are referenced in place (no copy); Parquet
+    only decodes the column chunks of the requested columns.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    columns = list(usecols) if usecols else None
+    if ext == ".parquet":
+        return pq.ParquetFile(arrow_source(file)).read(columns=columns)
+    try:
+        # Feather v2 is the Arrow IPC file format; this also reads legacy Feather v1
+        return feather.read_table(arrow_source(file), columns=columns)
+    except pa.ArrowInvalid:
+        # Arrow IPC stream format
+        table = pa.ipc.open_stream(arrow_source(file)).read_all()
+        return table.select(columns) if columns else table
+
+def index_as_columns(df):
+    """Frame with the index levels pandas serialized from named columns (df.set_index("b")) turned back into columns
+
+    They are placed last, where the file stores them. Unnamed indexes are row
+    labels, not data, and are left as the index.
+    """
+    names = [name for name in df.index.names if name is not None]
+    if not names:
+        return df
+    df = df.reset_index(names)
+    return df[[col for col in df.columns if col not in names] + names]
+
+def read_columnar_chunks(file, ext, chunksize, usecols=None):
+    """Yield a columnar upload as DataFrames of at most `chunksize` rows
+
+    Parquet is decoded one batch at a time from consecutive row groups, so row
+    groups past the last consumed chunk (e.g. for a preview) are never read.
+    """
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(arrow_source(file))
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=list(usecols) if usecols else None):
+            yield index_as_columns(batch.to_pandas(split_blocks=True))
+        return
+    for batch in read_columnar_table(file, ext, usecols).to_batches(max_chunksize=chunksize):
+        yield index_as_columns(batch.to_pandas(split_blocks=True))
+
+def read_file_chunks(file, ext, chunksize, csv_engine="Auto", usecols=None):
+    """Chunked reader for any supported upload type"""
+    if ext == ".xlsx":
+        return read_excel_chunks(file, chunksize, usecols)
+    if ext in COLUMNAR_EXTENSIONS:
+        return read_columnar_chunks(file, ext, chunksize, usecols)
+    return read_csv_chunks(file, chunksize, csv_engine, usecols, csv_compression(ext))
+
+def read_columnar_schema(file, ext):
+    """Schema of a columnar upload, read from its footer or header only"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if ext == ".parquet":
+        return pq.read_schema(arrow_source(file))
+    try:
+        return pa.ipc.open_file(arrow_source(file)).schema
+    except pa.ArrowInvalid:
+        try:
+            return pa.ipc.open_stream(arrow_source(file)).schema
+        except pa.ArrowInvalid:
+            # Legacy Feather v1 has neither IPC layout
+            import pyarrow.feather as feather
+
+            return feather.read_table(arrow_source(file)).schema
+
+def read_columns(file, ext):
+    """Column names of an upload, reading only its header"""
+    rewind(file)
+    if ext == ".xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        columns = excel_column_names(header)
+    elif ext in COLUMNAR_EXTENSIONS:
+        schema = read_columnar_schema(file, ext)
+        # Skip an unnamed serialized pandas index (row labels); named ones are columns again (see index_as_columns)
+        columns = [name for name in schema.names if not name.startswith("__index_level_")]
+    else:
+        columns = read_csv_head(file, csv_compression(ext), nrows=0).columns.tolist()
+    rewind(file)
+    return columns
+
+def infer_dtypes(file, sample_rows=DTYPE_SAMPLE_ROWS, usecols=None, compression=None):
+    """Infer read_csv options from the first `sample_rows` rows of a CSV upload
+
+    Returns {"dtype": ..., "parse_dates": ...} covering booleans, ISO-8601
+    datetimes and low-cardinality text (categoricals). Numeric widths are not
+    forced at parse time: the parsers silently wrap or truncate values that do
+    not fit a too-narrow dtype, so downcast_frame narrows them after the read.
+    """
+    sample = read_csv_head(
+        file,
+        compression,
+        nrows=sample_rows,
+        usecols=list(usecols) if usecols else None,
+        low_memory=False
+    )
+
+    dtypes, parse_dates = {}, []
+    for col in sample.select_dtypes(include=["object", "string"]).columns:
+        values = sample[col].dropna()
+        if values.empty:
+            continue
+        text = values.astype(str)
+        if text.str.lower().isin(["true", "false"]).all():
+            dtypes[col] = "boolean"
+            continue
+        if text.str.contains(r"^\d{4}-\d{2}-\d{2}", regex=True).all():
+            try:
+                pd.to_datetime(text, format="ISO8601")
+                parse_dates.append(col)
+                continue
+            except (ValueError, TypeError):
+                pass
+        if text.nunique() <= CATEGORY_MAX_RATIO * len(text):
+            dtypes[col] = "category"
+    return {"dtype": dtypes, "parse_dates": parse_dates}
+
+def downcast_frame(df):
+    """Shrink columns in place to the smallest dtype that holds every value exactly
+
+    Integers go to the narrowest signed/unsigned width, floats to float32 only
+    when no value changes, and text to categoricals when few values repeat often
+    enough to pay off (categoricals from infer_dtypes that turned out nearly
+    unique are turned back into plain text).
+    """
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.DatetimeTZDtype):
+            continue
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            unsigned = len(series) and series.min() >= 0
+            df[col] = pd.to_numeric(series, downcast="unsigned" if unsigned else "integer")
+        elif pd.api.types.is_float_dtype(series) and series.dtype != "float32" and not pd.api.types.is_extension_array_dtype(series):
+            narrowed = series.astype("float32")
+            if ((narrowed == series) | series.isna()).all():
+                df[col] = narrowed
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            if len(series.cat.categories) > CATEGORY_MAX_RATIO * max(series.count(), 1):
+                df[col] = series.astype(series.cat.categories.dtype)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            non_null = series.count()
+            if non_null and series.nunique() <= CATEGORY_MAX_RATIO * non_null:
+                df[col] = series.astype("category")
+    return df
+
+def read_csv_compact(file, engine, sample_rows=DTYPE_SAMPLE_ROWS, usecols=None, compression=None):
+    """Read a CSV with dtypes inferred from a sample, then downcast numeric columns"""
+    options = infer_dtypes(file, sample_rows, usecols, compression)
+    projection = {"usecols": list(usecols)} if usecols else {}
+    try:
+        df = read_csv_with_engine(file, engine, compression, **options, **projection)
+    except (ValueError, TypeError):
+        # A value past the sample did not fit an inferred dtype (e.g. "maybe" in a boolean column)
+        df = read_csv_with_engine(file, engine, compression, **projection)
+    return downcast_frame(df)
+
+def load_frame(file, ext, engine="Auto", disk_cache_bytes=0, excel_engine="Auto", dtype_sample_rows=0, usecols=None):
+    """Parse an upload into a DataFrame; errors propagate to the caller
+
+    With disk_cache_bytes > 0 parsed frames are also kept in the on-disk parse
+    cache, so the same bytes uploaded again (after a restart or by another
+    session) load from Parquet instead of being parsed. With dtype_sample_rows > 0
+    dtypes are inferred from that many rows and columns are stored compactly.
+    With `usecols`, only those columns are parsed (in file order). Compressed
+    CSVs (".csv.gz", ".csv.bz2", ".csv.zst", ".csv.zip") are decompressed as
+    they are parsed.
+    """
+    cache_path = None
+    # Columnar inputs load as fast as the cache itself
+    if disk_cache_bytes and HAS_PYARROW and ext not in COLUMNAR_EXTENSIONS:
+        cache_path = parse_cache_path(
+            upload_digest(file),
+            ext=ext,
+            engine=engine,
+            excel_engine=excel_engine,
+            dtype_sample_rows=dtype_sample_rows,
+            usecols=tuple(usecols) if usecols else None
+        )
+        df = load_cached_frame(cache_path)
+        if df is not None:
+            return df
+
+    if ext in CSV_EXTENSIONS:
+        engine_name = choose_csv_engine(upload_size(file), engine)
+        compression = csv_compression(ext)
+        if dtype_sample_rows:
+            df = read_csv_compact(file, engine_name, dtype_sample_rows, usecols, compression)
+        elif usecols:
+            df = read_csv_with_engine(file, engine_name, compression, usecols=list(usecols))
+        else:
+            df = read_csv_with_engine(file, engine_name, compression)
+    elif ext == ".xlsx":
+        df = read_excel_with_engine(file, choose_excel_engine(upload_size(file), excel_engine), usecols)
+        if dtype_sample_rows:
+            df = downcast_frame(df)
+    elif ext in COLUMNAR_EXTENSIONS:
+        # split_blocks keeps one block per column, so null-free numeric columns convert without a copy
+        df = index_as_columns(read_columnar_table(file, ext, usecols).to_pandas(split_blocks=True))
+        if dtype_sample_rows:
+            df = downcast_frame(df)
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+    if cache_path:
+        store_cached_frame(cache_path, df, disk_cache_bytes)
+    return df
@@ -0,0 +1,225 @@
+"""Mergeable streaming summaries for Data Sweeper's fill statistics
+
+KLL sketches answer quantile (and median) queries and Misra-Gries summaries
+find the most frequent values, in one pass and in memory that does not grow
+with the data. Both merge, so chunks can be summarized in parallel and
+combined; the exact summaries (all values, all counts) merge the same way.
+Grouped fills keep one summary per group of rows.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from groups import group_codes, group_slices, group_frame
+
+# Items per KLL compactor level: ranks are off by roughly a fraction log2(n / KLL_K) / KLL_K
+KLL_K = 2048
+# Counters kept by a Misra-Gries summary: any value more frequent than n / (MODE_COUNTERS + 1) is kept
+MODE_COUNTERS = 1024
+# Threads summarizing chunks at once (NumPy sorts and pandas value_counts release the GIL)
+SKETCH_WORKERS = 4
+
+def kll_compress(levels, k=KLL_K, rng=None):
+    """Compact KLL levels in place until each holds at most k items
+
+    Level h items stand for 2**h input values. A full level is sorted and
+    every other item, from a random offset, moves up a level, which keeps
+    rank estimates unbiased.
+    """
+    # Seeded from the sketch size: reproducible results, but a fresh offset sequence per call
+    rng = rng or np.random.default_rng(sum(len(level) for level in levels))
+    h = 0
+    while h < len(levels):
+        if len(levels[h]) > k:
+            level = np.sort(levels[h])
+            odd = len(level) % 2
+            promoted = level[odd:][rng.integers(2)::2]
+            levels[h] = level[:odd]
+            if h + 1 == len(levels):
+                levels.append(promoted)
+            else:
+                levels[h + 1] = np.concatenate([levels[h + 1], promoted])
+        h += 1
+    return levels
+
+def kll_sketch(values, k=KLL_K):
+    """KLL sketch (list of levels) of a float array"""
+    return kll_compress([np.asarray(values, dtype="float64")], k)
+
+def kll_merge(a, b, k=KLL_K):
+    """Merge two KLL sketches"""
+    levels = [
+        np.concatenate([a[h] if h < len(a) else a[0][:0], b[h] if h < len(b) else b[0][:0]])
+        for h in range(max(len(a), len(b)))
+    ]
+    return kll_compress(levels, k)
+
+def kll_quantile(levels, q):
+    """Estimated q-quantile of the values summarized by a KLL sketch; NaN when empty"""
+    items = np.concatenate(levels)
+    if not len(items):
+        return np.nan
+    weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(levels)])
+    order = np.argsort(items, kind="stable")
+    ranks = np.cumsum(weights[order])
+    return float(items[order][min(np.searchsorted(ranks, q * ranks[-1]), len(items) - 1)])
+
+def frequent_merge(a, b, counters=MODE_COUNTERS):
+    """Merge two value-count Series, keeping a Misra-Gries summary of at most `counters` values
+
+    The (counters + 1)-th largest count is subtracted from every count, so a
+    value's count is under-estimated by at most n / (counters + 1). With
+    counters None, counts are merged exactly.
+    """
+    counts = a.add(b, fill_value=0)
+    if counters is not None and len(counts) > counters:
+        threshold = counts.nlargest(counters + 1).iloc[-1]
+        counts = counts[counts > threshold] - threshold
+    return counts
+
+def frequent_counts(series, counters=MODE_COUNTERS):
+    """Value counts of a series, reduced to a Misra-Gries summary of at most `counters` values"""
+    counts = series.value_counts()
+    return frequent_merge(counts[counts > 0], counts[:0], counters)
+
+def most_frequent(counts):
+    """Most frequent value of a value-count summary; None when empty"""
+    return counts.idxmax() if len(counts) else None
+
+def summarize_chunks(chunks, summarize, merge, workers=SKETCH_WORKERS):
+    """Fold summarize(chunk) over chunks with merge, summarizing up to `workers` chunks at once
+
+    Chunks are merged in stream order, so the result does not depend on
+    thread timing; at most `workers` chunks are held at a time.
+    """
+    result = None
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(summarize, chunk))
+            if len(pending) >= workers:
+                summary = pending.popleft().result()
+                result = summary if result is None else merge(result, summary)
+        while pending:
+            summary = pending.popleft().result()
+            result = summary if result is None else merge(result, summary)
+    return result
+
+def column_summaries(chunks, columns_of, summarize_column, merge_column, workers=SKETCH_WORKERS):
+    """Per-column summaries over chunks: {column: summary} for the columns columns_of(chunk) picks"""
+    def summarize(chunk):
+        return {col: summarize_column(chunk[col]) for col in columns_of(chunk)}
+
+    def merge(a, b):
+        merged = dict(a)
+        for col, summary in b.items():
+            merged[col] = merge_column(merged[col], summary) if col in merged else summary
+        return merged
+
+    return summarize_chunks(chunks, summarize, merge, workers) or {}
+
+def column_quantiles(chunks, q=0.5, exact=False, workers=SKETCH_WORKERS):
+    """q-quantile of each numeric column over chunks; columns without values are left out
+
+    Exact quantiles keep every value (pandas' linear interpolation); otherwise
+    they are estimated from KLL sketches.
+    """
+    def values(series):
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        return values[~np.isnan(values)]
+
+    def numeric(chunk):
+        return chunk.select_dtypes(include=["number"]).columns
+
+    if exact:
+        summaries = column_summaries(chunks, numeric, lambda s: [values(s)], lambda a, b: a + b, workers)
+        result = {col: pd.Series(np.concatenate(parts)).quantile(q) for col, parts in summaries.items()}
+    else:
+        summaries = column_summaries(chunks, numeric, lambda s: kll_sketch(values(s)), kll_merge, workers)
+        result = {col: kll_quantile(levels, q) for col, levels in summaries.items()}
+    return pd.Series({col: value for col, value in result.items() if not pd.isna(value)}, dtype="float64")
+
+def column_modes(chunks, exact=False, workers=SKETCH_WORKERS):
+    """Most frequent value of every column over chunks; columns without values are left out
+
+    Exact modes merge complete value counts; otherwise Misra-Gries summaries
+    bound the counts kept to MODE_COUNTERS per column.
+    """
+    counters = None if exact else MODE_COUNTERS
+    summaries = column_summaries(
+        chunks,
+        lambda chunk: chunk.columns,
+        lambda series: frequent_counts(series, counters),
+        lambda a, b: frequent_merge(a, b, counters),
+        workers
+    )
+    modes = {col: most_frequent(counts) for col, counts in summaries.items()}
+    return pd.Series({col: value for col, value in modes.items() if value is not None}, dtype="object")
+
+def group_summaries(chunks, by, columns_of, values_of, summarize_values, merge_summary, workers=SKETCH_WORKERS):
+    """Per-group summaries over chunks: {column: {group key: summary}}
+
+    Each chunk is grouped in one hash pass over the key columns `by`; the
+    values of each group (values_of(column) sliced by row) are summarized, and
+    the summaries of a group merged across chunks.
+    """
+    def summarize(chunk):
+        codes, keys = group_codes(chunk, by)
+        slices = list(group_slices(codes, len(keys)))
+        summaries = {}
+        for col in columns_of(chunk).difference(by, sort=False):
+            values = values_of(chunk[col])
+            summaries[col] = {keys[group]: summarize_values(values[rows]) for group, rows in slices}
+        return summaries
+
+    def merge(a, b):
+        merged = {col: dict(groups) for col, groups in a.items()}
+        for col, groups in b.items():
+            merged_groups = merged.setdefault(col, {})
+            for key, summary in groups.items():
+                merged_groups[key] = merge_summary(merged_groups[key], summary) if key in merged_groups else summary
+        return merged
+
+    return summarize_chunks(chunks, summarize, merge, workers) or {}
+
+def group_quantiles(chunks, by, q=0.5, exact=False, workers=SKETCH_WORKERS):
+    """q-quantile of each numeric column per group of the key columns `by`, as a DataFrame indexed by group key
+
+    Exact and estimated quantiles are those of column_quantiles, per group.
+    """
+    def values(series):
+        return series.to_numpy(dtype="float64", na_value=np.nan)
+
+    def numeric(chunk):
+        return chunk.select_dtypes(include=["number"]).columns
+
+    def present(values):
+        return values[~np.isnan(values)]
+
+    if exact:
+        summaries = group_summaries(chunks, by, numeric, values, lambda v: [present(v)], lambda a, b: a + b, workers)
+        result = {
+            col: {key: pd.Series(np.concatenate(parts)).quantile(q) for key, parts in groups.items()}
+            for col, groups in summaries.items()
+        }
+    else:
+        summaries = group_summaries(chunks, by, numeric, values, lambda v: kll_sketch(present(v)), kll_merge, workers)
+        result = {col: {key: kll_quantile(levels, q) for key, levels in groups.items()} for col, groups in summaries.items()}
+    return group_frame({col: {key: value for key, value in groups.items() if not pd.isna(value)} for col, groups in result.items()}, by)
+
+def group_modes(chunks, by, exact=False, workers=SKETCH_WORKERS):
+    """Most frequent value of every column per group of the key columns `by`, as a DataFrame indexed by group key"""
+    counters = None if exact else MODE_COUNTERS
+    summaries = group_summaries(
+        chunks,
+        by,
+        lambda chunk: chunk.columns,
+        lambda series: series.to_numpy(),
+        lambda values: frequent_counts(pd.Series(values), counters),
+        lambda a, b: frequent_merge(a, b, counters),
+        workers
+    )
+    modes = {col: {key: most_frequent(counts) for key, counts in groups.items()} for col, groups in summaries.items()}
+    return group_frame({col: {key: value for key, value in groups.items() if value is not None} for col, groups in modes.items()}, by)
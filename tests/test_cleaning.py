@@ -0,0 +1,23 @@
+import tracemalloc
+
+import numpy as np
+
+from cleaning import track_allocations
+
+
+def test_track_allocations_leaves_outside_tracing_running():
+    report = []
+    with track_allocations(report, "outer"):
+        with track_allocations(report, "inner"):
+            kept = np.ones(100_000)
+    assert [label for label, _ in report] == ["inner", "outer"]
+    assert all(size >= kept.nbytes for _, size in report)
+    assert not tracemalloc.is_tracing()
+
+    tracemalloc.start()
+    try:
+        with track_allocations(report, "traced"):
+            np.ones(100_000)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
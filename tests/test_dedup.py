@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+import dedup
+from dedup import key_hashes, load_hash_index, in_hash_index, remember_rows
+from readers import load_frame, read_file_chunks
+
+CSV = b"""id,joined,active,city,score
+1,2024-01-05,true,Lahore,1.5
+2,2024-02-10,false,Karachi,
+3,2024-03-15,TRUE,Lahore,2.0
+4,,false,,3.25
+"""
+
+
+def test_remembered_rows_are_seen_whatever_the_read_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, "HASH_INDEX_DIR", str(tmp_path / "index"))
+    upload = tmp_path / "people.csv"
+    upload.write_bytes(CSV)
+    upload = str(upload)
+    compact = load_frame(upload, ".csv", dtype_sample_rows=100)
+    assert pd.api.types.is_datetime64_any_dtype(compact["joined"])
+    assert remember_rows([compact]) == 4
+
+    plain = load_frame(upload, ".csv")
+    streamed = pd.concat(read_file_chunks(upload, ".csv", 2), ignore_index=True)
+    text_flags = pd.read_csv(upload, dtype={"active": str})
+    for frame in (plain, streamed, text_flags, compact.astype({"city": object})):
+        assert in_hash_index(key_hashes(frame), load_hash_index()).all()
+
+    changed = plain.copy()
+    changed.loc[0, "joined"] = "2024-01-06"
+    changed.loc[1, "active"] = True
+    assert in_hash_index(key_hashes(changed), load_hash_index()).tolist() == [False, False, True, True]
+    assert len(np.unique(key_hashes(plain))) == 4
@@ -0,0 +1,23 @@
+import io
+
+import pandas as pd
+
+from readers import read_columns, read_excel_with_engine, read_file_chunks
+
+
+def excel_upload(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_excel_numeric_headers_are_selected_by_name():
+    df = pd.DataFrame({"region": ["north", "south"], 2022: [1, 2], 2023: [3, 4], 1: [5, 6]})
+    upload = excel_upload(df)
+    assert read_columns(upload, ".xlsx") == ["region", 2022, 2023, 1]
+    for engine in ("openpyxl", "openpyxl-readonly"):
+        frame = read_excel_with_engine(upload, engine, usecols=("region", 2023, 1))
+        pd.testing.assert_frame_equal(frame, df[["region", 2023, 1]], check_dtype=False)
+    chunks = list(read_file_chunks(upload, ".xlsx", 1, usecols=(2022,)))
+    assert pd.concat(chunks, ignore_index=True)[2022].tolist() == [1, 2]
@@ -0,0 +1,27 @@
+import io
+
+import pandas as pd
+
+from writers import write_excel, write_excel_workbooks
+
+
+def sheets_of(sink):
+    sink.seek(0)
+    return pd.read_excel(sink, sheet_name=None)
+
+
+def test_openpyxl_writes_a_sheet_for_an_empty_stream():
+    sink = io.BytesIO()
+    assert write_excel(iter(()), sink) == 0
+    assert list(sheets_of(sink)) == ["Sheet1"]
+
+    sinks = []
+    def new_sink():
+        sinks.append(io.BytesIO())
+        return sinks[-1]
+    assert write_excel_workbooks(iter(()), new_sink, "openpyxl") == 0
+    assert len(sinks) == 1 and list(sheets_of(sinks[0])) == ["Sheet1"]
+
+    sink = io.BytesIO()
+    write_excel(iter([pd.DataFrame({"id": [], "name": []})]), sink)
+    assert list(sheets_of(sink)["Sheet1"].columns) == ["id", "name"]
@@ -0,0 +1,485 @@
+"""Streaming writers for Data Sweeper's converted files
+
+Outputs are encoded chunk by chunk straight into a binary sink (a temporary
+file, a ZIP entry), so peak memory during an export depends on the chunk
+size, not on the size of the output (a Parquet row group or Arrow record
+batch at most). Bulk ZIP archives are likewise built on disk, entry by entry.
+"""
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+import pandas as pd
+
+try:
+    import xlsxwriter
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
+
+# Rows encoded at a time when a whole frame is exported
+EXPORT_CHUNK_ROWS = 50_000
+
+# Excel writers: with xlsxwriter installed, outputs of at least this many rows (and
+# streamed outputs, whose size is not known up front) use its constant-memory mode
+EXCEL_WRITERS = ["Auto", "xlsxwriter (constant memory)", "openpyxl"]
+CONSTANT_MEMORY_MIN_ROWS = 20_000
+
+# A worksheet holds at most EXCEL_MAX_ROWS rows, the header included; longer
+# outputs are split into parts of EXCEL_MAX_ROWS - 1 data rows, written as
+# further worksheets of one workbook or as further workbooks
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_SPLITS = ["Sheets", "Workbooks"]
+
+# Columnar outputs (written with pyarrow): Feather is the Arrow IPC file format
+# under another extension. Row groups (record batches for Arrow) hold this many
+# rows by default.
+COLUMNAR_FORMATS = ["Parquet", "Feather", "Arrow"]
+PARQUET_CODECS = ["snappy", "zstd", "gzip", "none"]
+IPC_CODECS = ["zstd", "lz4", "none"]
+ROW_GROUP_ROWS = 128 * 1024
+
+# Bulk ZIP entries are deflated in this many worker threads (zlib releases the
+# GIL while compressing), reading and copying COPY_BLOCK bytes at a time
+ZIP_WORKERS = min(4, os.cpu_count() or 1)
+ZIP_LEVEL = 6
+COPY_BLOCK = 1024 * 1024
+
+OUTPUT_EXTENSIONS = {"CSV": ".csv", "Excel": ".xlsx", "Parquet": ".parquet", "Feather": ".feather", "Arrow": ".arrow"}
+CSV_MIME = "text/csv"
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PARQUET_MIME = "application/vnd.apache.parquet"
+ARROW_MIME = "application/vnd.apache.arrow.file"
+
+def frame_chunks(df, rows=EXPORT_CHUNK_ROWS):
+    """Yield df in slices of `rows` rows (views, not copies); an empty frame yields itself"""
+    for start in range(0, max(len(df), 1), rows):
+        yield df.iloc[start:start + rows]
+
+def write_csv(chunks, sink):
+    """Encode chunks as one CSV file into a binary sink; returns the rows written"""
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(sink, index=False, header=(i == 0))
+        rows += len(chunk)
+    return rows
+
+def choose_excel_writer(rows=None, requested="Auto"):
+    """Resolve the Excel writer setting to xlsxwriter or openpyxl for an output of `rows` rows (None: unknown)"""
+    if requested == "openpyxl" or not HAS_XLSXWRITER:
+        return "openpyxl"
+    if requested == "Auto" and rows is not None and rows < CONSTANT_MEMORY_MIN_ROWS:
+        return "openpyxl"
+    return "xlsxwriter"
+
+def excel_parts(chunks, rows=EXCEL_MAX_ROWS - 1):
+    """Yield (part, chunk) for chunks cut at every `rows` rows, with the number (0, 1, ...) of the part each belongs to
+
+    Chunks are sliced, not copied or buffered; empty chunks are passed on
+    with the current part.
+    """
+    part, used = 0, 0
+    for chunk in chunks:
+        if chunk.empty:
+            yield part, chunk
+        start = 0
+        while start < len(chunk):
+            if used == rows:
+                part, used = part + 1, 0
+            stop = min(start + rows - used, len(chunk))
+            yield part, chunk.iloc[start:stop]
+            used += stop - start
+            start = stop
+
+def cell_values(chunk):
+    """Columns of chunk as object arrays of Python values, with None for nulls"""
+    return [
+        chunk[col].astype(object).where(chunk[col].notna(), None).to_numpy()
+        for col in chunk.columns
+    ]
+
+def write_excel_constant_memory(chunks, sink, sheet_rows=EXCEL_MAX_ROWS - 1):
+    """Write chunks as worksheets of `sheet_rows` rows into a binary sink with xlsxwriter's constant-memory mode
+
+    Each row is flushed to a temporary file as soon as the next one starts, so
+    memory use does not grow with the sheet; rows must therefore be written in
+    order, which pandas' column-by-column to_excel does not do. Rows past a
+    sheet's limit go to the next sheet, Sheet2, Sheet3... Returns the rows
+    written.
+    """
+    workbook = xlsxwriter.Workbook(sink, {
+        "constant_memory": True,
+        "strings_to_numbers": False,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+        "remove_timezone": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    header = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    sheets, rows, row = 0, 0, 0
+    try:
+        for part, chunk in excel_parts(chunks, sheet_rows):
+            if part == sheets:
+                worksheet = workbook.add_worksheet(f"Sheet{part + 1}")
+                worksheet.write_row(0, 0, [str(col) for col in chunk.columns], header)
+                sheets, row = sheets + 1, 0
+            for values in zip(*cell_values(chunk)):
+                row += 1
+                worksheet.write_row(row, 0, values)
+            rows += len(chunk)
+    finally:
+        workbook.close()
+    return rows
+
+def write_excel(chunks, sink, sheet_rows=EXCEL_MAX_ROWS - 1):
+    """Write chunks as worksheets of `sheet_rows` rows into a binary sink with openpyxl; returns the rows written
+
+    openpyxl builds the whole workbook in memory before saving it.
+    """
+    rows, sheet, row = 0, -1, 0
+    with pd.ExcelWriter(sink, engine="openpyxl") as writer:
+        for part, chunk in excel_parts(chunks, sheet_rows):
+            if part != sheet:
+                sheet, row = part, 0
+            chunk.to_excel(writer, sheet_name=f"Sheet{part + 1}", index=False, header=(row == 0), startrow=row + (row > 0))
+            row += len(chunk)
+            rows += len(chunk)
+        # A workbook needs a visible sheet, even for an empty stream of chunks
+        if sheet < 0:
+            pd.DataFrame().to_excel(writer, sheet_name="Sheet1", index=False)
+    return rows
+
+def write_excel_workbooks(chunks, new_sink, writer="xlsxwriter", sheet_rows=EXCEL_MAX_ROWS - 1):
+    """Write chunks as one-sheet workbooks of `sheet_rows` rows, each into a binary sink from new_sink()
+
+    Parts are written one after the other as the chunks arrive, so with
+    openpyxl only one part's workbook is held in memory. Returns the rows
+    written.
+    """
+    write = write_excel_constant_memory if writer == "xlsxwriter" else write_excel
+    rows, parts = 0, 0
+    for _, part in groupby(excel_parts(chunks, sheet_rows), key=itemgetter(0)):
+        rows += write((chunk for _, chunk in part), new_sink(), sheet_rows)
+        parts += 1
+    # An empty stream of chunks still gives one workbook
+    if not parts:
+        write(iter(()), new_sink(), sheet_rows)
+    return rows
+
+def text_values(series):
+    """Object column with every non-null value as its str, like the CSV and Excel outputs write them"""
+    return series.astype(str).where(series.notna(), None).astype(object)
+
+def mixes_kinds(series):
+    """Whether an object column mixes kinds of values, such as numbers and text (ints with floats are just numbers)"""
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    return kind.startswith("mixed") and kind != "mixed-integer-float"
+
+def plain_table(chunk):
+    """Arrow table of a chunk without pandas metadata, dictionary columns decoded
+
+    Object columns mixing kinds of values (numbers and text, as Excel
+    columns often do) have no Arrow type, so they are written as text.
+    Other values Arrow cannot convert raise ValueError.
+    """
+    import pyarrow as pa
+
+    mixed = [col for col in chunk.columns if chunk[col].dtype == object and mixes_kinds(chunk[col])]
+    if mixed:
+        chunk = chunk.copy(deep=False)
+        for col in mixed:
+            chunk[col] = text_values(chunk[col])
+    try:
+        table = pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata(None)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Cannot convert the data to Arrow ({e})") from e
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table
+
+def promoted_type(a, b):
+    """Arrow type holding the values of types a and b
+
+    Nulls take the other type, integers widen to int64 (float64 with floats)
+    and timestamps to nanoseconds; any other mix becomes text.
+    """
+    import pyarrow as pa
+
+    if a == b or pa.types.is_null(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    numbers = [t for t in (a, b) if pa.types.is_integer(t) or pa.types.is_floating(t)]
+    if len(numbers) == 2:
+        return pa.float64() if any(pa.types.is_floating(t) for t in numbers) else pa.int64()
+    if pa.types.is_timestamp(a) and pa.types.is_timestamp(b) and a.tz == b.tz:
+        return pa.timestamp("ns", a.tz)
+    return pa.large_string()
+
+def promoted_schema(schema, other):
+    """Schema holding the tables of two schemas with the same columns (see promoted_type)"""
+    for i, field in enumerate(schema):
+        value_type = promoted_type(field.type, other.field(i).type)
+        if value_type != field.type:
+            schema = schema.set(i, field.with_type(value_type))
+    return schema
+
+def spool_table(spool, table):
+    """Append a table to a binary file as a length-prefixed Arrow IPC stream, lz4-compressed when available"""
+    import pyarrow as pa
+
+    codec = "lz4" if pa.Codec.is_available("lz4") else None
+    buffer = pa.BufferOutputStream()
+    with pa.ipc.new_stream(buffer, table.schema, options=pa.ipc.IpcWriteOptions(compression=codec)) as writer:
+        writer.write_table(table)
+    data = buffer.getvalue()
+    spool.write(len(data).to_bytes(8, "little"))
+    spool.write(data)
+
+def spooled_tables(spool):
+    """Yield the tables appended to a binary file by spool_table, from its start"""
+    import pyarrow as pa
+
+    spool.seek(0)
+    while size := spool.read(8):
+        yield pa.ipc.open_stream(spool.read(int.from_bytes(size, "little"))).read_all()
+
+def chunk_tables(chunks):
+    """Arrow tables of chunks (see plain_table), cast to one schema
+
+    Chunks of a stream are typed one by one, so a column may be int64 in one
+    and float64 in a later one, or only hold nulls at first, while a Parquet
+    or Arrow file has a single schema. The tables are spooled to a temporary
+    file while the schema is widened to hold them all (see promoted_type;
+    columns with only nulls are typed as strings), then read back one at a
+    time and cast to it: one table is held in memory at a time, at the cost
+    of a temporary copy on disk.
+    """
+    import pyarrow as pa
+
+    with tempfile.TemporaryFile() as spool:
+        schema = None
+        for chunk in chunks:
+            table = plain_table(chunk)
+            schema = table.schema if schema is None else promoted_schema(schema, table.schema)
+            spool_table(spool, table)
+        if schema is None:
+            return
+        for i, field in enumerate(schema):
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, field.with_type(pa.string()))
+        for table in spooled_tables(spool):
+            try:
+                yield table.cast(schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"Column types changed between chunks ({e})") from e
+
+def row_groups(tables, rows):
+    """Regroup a stream of tables with one schema into tables of `rows` rows (the last may be shorter)
+
+    Slices share the buffers of the concatenated tables; only up to `rows`
+    rows are held back between chunks.
+    """
+    import pyarrow as pa
+
+    pending, pending_rows, emitted = [], 0, False
+    for table in tables:
+        pending.append(table)
+        pending_rows += table.num_rows
+        if pending_rows >= rows:
+            combined = pa.concat_tables(pending)
+            full = pending_rows - pending_rows % rows
+            for start in range(0, full, rows):
+                yield combined.slice(start, rows)
+            pending, pending_rows, emitted = [combined.slice(full)], pending_rows - full, True
+    # An empty stream of chunks still yields one (empty) table for its schema
+    if pending_rows or pending and not emitted:
+        yield pa.concat_tables(pending)
+
+def encode_dictionaries(table, dictionaries):
+    """Dictionary-encode the text columns of a table against growing dictionaries
+
+    `dictionaries` maps columns to the values seen so far; new values are
+    appended, so every batch's dictionary extends the previous one and the
+    IPC writer only emits deltas.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for i, field in enumerate(table.schema):
+        if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)):
+            continue
+        values = table.column(i)
+        known = dictionaries.get(field.name, pa.array([], field.type))
+        distinct = pc.unique(values).drop_null()
+        known = pa.concat_arrays([known, distinct.filter(pc.invert(pc.is_in(distinct, value_set=known)))])
+        dictionaries[field.name] = known
+        indices = pc.index_in(values, value_set=known).cast(pa.int32())
+        encoded = pa.chunked_array(
+            [pa.DictionaryArray.from_arrays(chunk, known) for chunk in indices.chunks],
+            type=pa.dictionary(pa.int32(), field.type)
+        )
+        table = table.set_column(i, field.name, encoded)
+    return table
+
+def write_parquet(chunks, sink, codec="snappy", row_group_rows=ROW_GROUP_ROWS, dictionary=True):
+    """Write chunks as a Parquet file into a binary sink, in row groups of `row_group_rows` rows; returns the rows written
+
+    `dictionary` turns on Parquet's dictionary encoding, which falls back to
+    plain encoding for columns whose dictionary grows too large.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, rows = None, 0
+    try:
+        for table in row_groups(chunk_tables(chunks), row_group_rows):
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema, compression=codec, use_dictionary=dictionary)
+            writer.write_table(table, row_group_size=row_group_rows)
+            rows += table.num_rows
+        if writer is None:
+            pq.write_table(pa.table({}), sink)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def write_ipc(chunks, sink, codec="zstd", row_group_rows=ROW_GROUP_ROWS, dictionary=True):
+    """Write chunks as an Arrow IPC (Feather v2) file into a binary sink, in record batches of `row_group_rows` rows
+
+    Record batches are compressed with `codec`; `dictionary` dictionary-encodes
+    text columns (see encode_dictionaries). Returns the rows written.
+    """
+    import pyarrow as pa
+
+    options = pa.ipc.IpcWriteOptions(compression=None if codec == "none" else codec, emit_dictionary_deltas=True)
+    writer, rows, dictionaries = None, 0, {}
+    try:
+        for table in row_groups(chunk_tables(chunks), row_group_rows):
+            # write_table emits a batch per chunk of the table, so merge the slices of each group
+            table = table.combine_chunks()
+            if dictionary:
+                table = encode_dictionaries(table, dictionaries)
+            if writer is None:
+                writer = pa.ipc.new_file(sink, table.schema, options=options)
+            writer.write_table(table, max_chunksize=row_group_rows)
+            rows += table.num_rows
+        if writer is None:
+            writer = pa.ipc.new_file(sink, pa.schema([]), options=options)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def write_chunks(chunks, conversion_type, new_sink, excel_writer="Auto", rows=None, excel_split="Sheets", **columnar_options):
+    """Write chunks as a file of a format in OUTPUT_EXTENSIONS into binary sinks from new_sink(); returns its MIME type
+
+    new_sink is called once, or once per workbook for Excel outputs longer
+    than a worksheet with `excel_split` (from EXCEL_SPLITS) "Workbooks".
+    `excel_writer` is a setting from EXCEL_WRITERS, resolved for an output of
+    `rows` rows (None: unknown) by choose_excel_writer; `columnar_options`
+    (codec, row_group_rows, dictionary) are passed to the Parquet and Arrow
+    writers.
+    """
+    if conversion_type == "CSV":
+        write_csv(chunks, new_sink())
+        return CSV_MIME
+    if conversion_type == "Parquet":
+        write_parquet(chunks, new_sink(), **columnar_options)
+        return PARQUET_MIME
+    if conversion_type in ("Feather", "Arrow"):
+        write_ipc(chunks, new_sink(), **columnar_options)
+        return ARROW_MIME
+    writer = choose_excel_writer(rows, excel_writer)
+    if excel_split == "Workbooks":
+        write_excel_workbooks(chunks, new_sink, writer)
+    elif writer == "xlsxwriter":
+        write_excel_constant_memory(chunks, new_sink())
+    else:
+        write_excel(chunks, new_sink())
+    return EXCEL_MIME
+
+def deflate_file(source, level=ZIP_LEVEL):
+    """Raw-deflate a binary file, from its start, into a temporary file; returns (temporary file, CRC-32, size, compressed size)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    output = tempfile.TemporaryFile()
+    crc, size = 0, 0
+    source.seek(0)
+    while block := source.read(COPY_BLOCK):
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+        output.write(compressor.compress(block))
+    output.write(compressor.flush())
+    return output, crc, size, output.tell()
+
+def append_deflated(archive, name, deflated):
+    """Append an entry deflated by deflate_file to a ZipFile open for writing
+
+    zipfile can only compress entries itself, so the local header is written
+    and the entry registered the way ZipFile.open(name, "w") does; the
+    central directory is written by ZipFile.close as usual.
+    """
+    compressed, crc, size, compressed_size = deflated
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o600 << 16
+    info.CRC, info.file_size, info.compress_size = crc, size, compressed_size
+    archive.fp.seek(archive.start_dir)
+    info.header_offset = archive.start_dir
+    archive.fp.write(info.FileHeader())
+    compressed.seek(0)
+    shutil.copyfileobj(compressed, archive.fp, COPY_BLOCK)
+    compressed.close()
+    archive.filelist.append(info)
+    archive.NameToInfo[name] = info
+    archive.start_dir = archive.fp.tell()
+
+def new_bulk_zip(workers=ZIP_WORKERS):
+    """Empty bulk ZIP archive; its temporary file, ZipFile and worker threads are created by the first add_zip_entry"""
+    return {"file": None, "archive": None, "pool": None, "workers": workers, "pending": deque(), "entries": 0}
+
+def write_finished(bulk, wait=False):
+    """Append deflated entries in the order they were added, up to the first still being deflated (all, with wait)"""
+    pending = bulk["pending"]
+    while pending and (wait or pending[0][1].done()):
+        name, future = pending.popleft()
+        append_deflated(bulk["archive"], name, future.result())
+        bulk["entries"] += 1
+
+def add_zip_entry(bulk, name, source):
+    """Queue a binary file as entry `name`: it is deflated in a worker thread and appended once the entries before it are
+
+    The file is read from its start in the worker, so nothing else should
+    read it until close_bulk_zip.
+    """
+    if bulk["archive"] is None:
+        bulk["file"] = tempfile.TemporaryFile()
+        bulk["archive"] = zipfile.ZipFile(bulk["file"], "w", compression=zipfile.ZIP_DEFLATED)
+        bulk["pool"] = ThreadPoolExecutor(max_workers=bulk["workers"])
+    bulk["pending"].append((name, bulk["pool"].submit(deflate_file, source)))
+    write_finished(bulk)
+
+def close_bulk_zip(bulk):
+    """Append the remaining entries and write the archive's central directory
+
+    Returns (temporary file holding the archive, number of entries), with
+    None for the file when no entry was added.
+    """
+    if bulk["archive"] is None:
+        return None, 0
+    try:
+        write_finished(bulk, wait=True)
+    finally:
+        bulk["archive"].close()
+        bulk["pool"].shutdown()
+    return bulk["file"], bulk["entries"]